@@ -0,0 +1,24 @@
+# benchmarks
+# ----------
+# Timings of the ingest and mesh building paths on synthetic data, run from the repository root as
+#     python -m benchmarks.ingest_benchmark
+#     python -m benchmarks.mesh_benchmark
+# The model modules are imported without running mapclientplugins/ecgstep/__init__.py, which registers the step
+# with the MAP Client and so imports PySide and mapclient.
+
+import os
+import sys
+import types
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _registerPackage(name, path):
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [path]
+        sys.modules[name] = package
+
+
+_registerPackage('mapclientplugins', os.path.join(_ROOT, 'mapclientplugins'))
+_registerPackage('mapclientplugins.ecgstep', os.path.join(_ROOT, 'mapclientplugins', 'ecgstep'))
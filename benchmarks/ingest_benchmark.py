@@ -0,0 +1,176 @@
+# ingest_benchmark.py
+# -------------------
+# Times the steps that turn a downloaded recording into mesh colours against the loops they replaced, on synthetic
+# ECG from fakeblackfynn, so the speedups can be reproduced without a Blackfynn account.
+#
+# Example:
+#     python -m benchmarks.ingest_benchmark
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from mapclientplugins.ecgstep.model.blackfynndatamodel import BlackfynnDataModel
+from mapclientplugins.ecgstep.model.fakeblackfynn import generateSyntheticEcg
+from mapclientplugins.ecgstep.model.resampler import Resampler
+
+
+def makeSyntheticFrame(number_of_samples, number_of_channels=1, sample_rate=1000, datetime_index=True):
+    """
+    Returns a data frame of synthetic ECG indexed by sample time, as a TimeSeries package returns it, or by sample
+    number, as a Tabular package does.
+    """
+    values = generateSyntheticEcg(number_of_channels, sample_rate, 0, number_of_samples, noise=0)
+    if datetime_index:
+        start = pd.Timestamp('2019-01-01', tz='UTC').value
+        nanoseconds = start + np.round(np.arange(number_of_samples) * 1e9 / sample_rate).astype(np.int64)
+        index = pd.DatetimeIndex(pd.to_datetime(nanoseconds, utc=True))
+    else:
+        index = pd.RangeIndex(number_of_samples)
+    return pd.DataFrame(values, index=index, columns=['ch{0}'.format(i + 1) for i in range(number_of_channels)])
+
+
+def _loopTimeseriesTimes(timeseries_dframe):
+    # The loop proecessTimeseriesData used before the times were vectorised
+    absolute_timeseries_values = timeseries_dframe.axes[0]
+    relative_times = []
+    for time in absolute_timeseries_values:
+        relative_times.append(round(time.timestamp() - absolute_timeseries_values[0].timestamp(), 6))
+    return relative_times
+
+
+def _loopTabularTimes(timeseries_dframe, number_of_samples_per_second, extra_length):
+    # The loops proecessTabularData used before the times were vectorised, with self._extra_length passed in
+    absolute_timeseries_values = timeseries_dframe.axes[0]
+    relative_times = []
+    if str(type(absolute_timeseries_values[0])) == "<class 'pandas._libs.tslibs.timestamps.Timestamp'>":
+        for time in absolute_timeseries_values:
+            relative_times.append(round(time.timestamp() - absolute_timeseries_values[0].timestamp(), 6) - extra_length/2)
+    else:
+        for time_sample in absolute_timeseries_values:
+            relative_times.append(time_sample/number_of_samples_per_second - extra_length/2)
+    return relative_times
+
+
+def benchmarkRelativeTimes(number_of_samples=1000000, sample_rate=1000):
+    """
+    Returns (package type, loop seconds, vectorised seconds, largest difference) for the times of a TimeSeries
+    frame indexed by sample time and a Tabular frame indexed by sample number, each of number_of_samples samples.
+    """
+    model = BlackfynnDataModel(client_factory=None)
+    extra_length = model._extra_length
+    results = []
+
+    timeseries_dframe = makeSyntheticFrame(number_of_samples, sample_rate=sample_rate)
+    start = time.time()
+    loop_times = _loopTimeseriesTimes(timeseries_dframe)
+    loop_seconds = time.time() - start
+    start = time.time()
+    vectorised_times = model._relativeTimes(timeseries_dframe.index)
+    vectorised_seconds = time.time() - start
+    results.append(('TimeSeries', loop_seconds, vectorised_seconds,
+                    np.max(np.abs(np.asarray(loop_times) - vectorised_times))))
+
+    tabular_dframe = makeSyntheticFrame(number_of_samples, sample_rate=sample_rate, datetime_index=False)
+    start = time.time()
+    loop_times = _loopTabularTimes(tabular_dframe, sample_rate, extra_length)
+    loop_seconds = time.time() - start
+    start = time.time()
+    vectorised_times = model._relativeTimes(tabular_dframe.index, sample_rate)
+    vectorised_times -= extra_length/2
+    vectorised_seconds = time.time() - start
+    results.append(('Tabular', loop_seconds, vectorised_seconds,
+                    np.max(np.abs(np.asarray(loop_times) - vectorised_times))))
+    return results
+
+
+def makeSyntheticMatrix(number_of_channels, number_of_samples, sample_rate=2000, block_size=65536):
+    """
+    Returns a (channels x samples) matrix of synthetic ECG, as ChannelData holds it, and its times in seconds. The
+    matrix is generated a block of samples at a time to keep the temporaries small.
+    """
+    matrix = np.empty((number_of_channels, number_of_samples))
+    for first in range(0, number_of_samples, block_size):
+        block_length = min(block_size, number_of_samples - first)
+        matrix[:, first:first + block_length] = generateSyntheticEcg(number_of_channels, sample_rate, first,
+                                                                     block_length, noise=0).T
+    return matrix, np.arange(number_of_samples) / float(sample_rate)
+
+
+def _loopDownsample(data, video_length, number_of_mesh_times):
+    # MeshGeneratorWidget._downsampledData before it worked on the channel matrix, with self.data,
+    # self._model.video.videoLength and len(self._time_sequence) passed in
+    video_time_sequence = []
+    for time_index, time_value in enumerate(data['times']):
+        # Only add data that to the mesh which is within the times of the video we will show
+        if time_value >= 0 and time_value <= video_length:
+            video_time_sequence.append(time_value)
+    # find which indices we desire to downsample to
+    downsampling_indices = np.linspace(0, len(video_time_sequence), number_of_mesh_times).round()
+    # downsample to our found indices and convert from dictionary to 2d array
+    downsampled_matrix = []
+    for key in data['cache']:
+        if 'time' not in key:
+            array_downsampled = []
+            array_values_in_video = []
+            for time_index, time_value in enumerate(data['times']):
+                # Only add data that to the mesh which is within the times of the video we will show
+                if time_value >= 0 and time_value <= video_length:
+                    array_values_in_video.append(data['cache'][key][time_index])
+            # Loop through and pick out our downsampled indices
+            for index, val in enumerate(array_values_in_video):
+                if index in downsampling_indices:
+                    array_downsampled.append(val)
+            # Add the final element
+            array_downsampled.append(array_values_in_video[-1])
+            # Add our array to the 2D matrix
+            downsampled_matrix.append(array_downsampled)
+    return downsampled_matrix
+
+
+def benchmarkDownsample(number_of_channels=256, number_of_samples=1000000, sample_rate=2000,
+                        number_of_mesh_times=300, modes=None):
+    """
+    Returns (mode, seconds) for resampling a (channels x samples) recording onto the mesh times over the whole
+    recording with each Resampler mode, as MeshGeneratorWidget._downsampledData does.
+    """
+    matrix, times = makeSyntheticMatrix(number_of_channels, number_of_samples, sample_rate)
+    target_times = np.linspace(0, times[-1], number_of_mesh_times)
+    results = []
+    for mode in modes or Resampler.getModes():
+        resampler = Resampler(mode)
+        start = time.time()
+        resampler.resample(matrix, times, target_times)
+        results.append((mode, time.time() - start))
+    return results
+
+
+def benchmarkLoopDownsample(number_of_channels=4, number_of_samples=20000, sample_rate=2000,
+                            number_of_mesh_times=300):
+    """
+    Returns the seconds the old loops take on a recording small enough for them to finish, they grow with
+    channels x samples x mesh times. The data is given to them as the channel name -> values dictionary and list
+    of times they read.
+    """
+    matrix, times = makeSyntheticMatrix(number_of_channels, number_of_samples, sample_rate)
+    data = {'cache': {'ch{0}'.format(i + 1): row.tolist() for i, row in enumerate(matrix)},
+            'times': times.tolist()}
+    start = time.time()
+    _loopDownsample(data, times[-1], number_of_mesh_times)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    print('Relative times of 1M sample frames')
+    print('{0:>10} {1:>10} {2:>16} {3:>12}'.format('package', 'loop (s)', 'vectorised (s)', 'difference'))
+    for package_type, loop_seconds, vectorised_seconds, difference in benchmarkRelativeTimes():
+        print('{0:>10} {1:>10.3f} {2:>16.4f} {3:>12.2g}'.format(package_type, loop_seconds, vectorised_seconds,
+                                                                 difference))
+
+    print('')
+    print('Resampling 256 channels x 1M samples onto 300 mesh times (target under 1 s)')
+    print('{0:>10} {1:>10}'.format('mode', 'seconds'))
+    for mode, seconds in benchmarkDownsample():
+        print('{0:>10} {1:>10.3f}'.format(mode, seconds))
+    print('Old loops on 4 channels x 20k samples: {0:.3f} s'.format(benchmarkLoopDownsample()))
@@ -0,0 +1,84 @@
+# mesh_benchmark.py
+# -----------------
+# Times BlackfynnMesh.generate_mesh, update_data and update_geometry against the size of the electrode grid, on a
+# synthetic scaffold description, so changes to mesh building can be checked for how they scale to high density
+# arrays. Needs opencmiss.zinc.
+#
+# Example:
+#     python -m benchmarks.mesh_benchmark
+
+import time
+
+import numpy as np
+
+from opencmiss.zinc.context import Context
+
+from mapclientplugins.ecgstep.model.blackfynnmesh import BlackfynnMesh
+
+
+def makePlateDescription(nodes_count_across, nodes_count_up, number_of_times):
+    """
+    Returns a time based node description of a flat unit plate with the given number of nodes, in the form the
+    scaffold port provides: a 'time_array' and each node's position at every time keyed by its identifier.
+    """
+    times = list(np.linspace(0.0, 1.0, number_of_times))
+    x, y = np.meshgrid(np.linspace(0.0, 1.0, nodes_count_across), np.linspace(0.0, 1.0, nodes_count_up))
+    description = {'time_array': times,
+                   'elements_count_across': nodes_count_across - 1,
+                   'elements_count_up': nodes_count_up - 1}
+    for node_identifier, (node_x, node_y) in enumerate(zip(x.ravel(), y.ravel())):
+        description['{0}'.format(node_identifier)] = [[node_x, node_y, 0.0]] * number_of_times
+    return description
+
+
+def _liftPlate(description, step):
+    # Returns a copy of a plate description whose nodes rise by step each time, so positions differ between times
+    lifted = dict(description)
+    for key in description:
+        if key.isdigit():
+            lifted[key] = [[x, y, z + step * index] for index, (x, y, z) in enumerate(description[key])]
+    return lifted
+
+
+def benchmarkGenerateMesh(grid_sizes=(8, 16, 32, 64, 96, 128), number_of_times=10, number_of_channels=64,
+                          bulk_load=False):
+    """
+    Builds an n x n node plate for each n in grid_sizes and returns (n, generate seconds, data update seconds,
+    geometry update seconds) for each. bulk_load reads node parameters from EX buffers instead of setting them one by
+    one, as BlackfynnMesh does by default.
+    """
+    results = []
+    for nodes_count in grid_sizes:
+        context = Context('benchmark')
+        region = context.getDefaultRegion()
+        description = makePlateDescription(nodes_count, nodes_count, number_of_times)
+        data = np.random.RandomState(0).standard_normal((number_of_channels, number_of_times))
+
+        mesh = BlackfynnMesh(region, description)
+        mesh.set_bulk_load(bulk_load)
+        mesh.set_data_time_sequence(description['time_array'])
+        mesh.set_data(data)
+        start = time.time()
+        mesh.generate_mesh()
+        generate_seconds = time.time() - start
+
+        start = time.time()
+        mesh.update_data(data[::-1], description['time_array'])
+        update_seconds = time.time() - start
+
+        start = time.time()
+        mesh.update_geometry(_liftPlate(description, 0.1))
+        geometry_seconds = time.time() - start
+        results.append((nodes_count, generate_seconds, update_seconds, geometry_seconds))
+    return results
+
+
+if __name__ == '__main__':
+    print('{0:>10} {1:>6} {2:>8} {3:>12} {4:>10} {5:>12}'.format('load', 'grid', 'nodes', 'generate (s)',
+                                                                 'update (s)', 'geometry (s)'))
+    for bulk_load in (False, True):
+        for nodes_count, generate_seconds, update_seconds, geometry_seconds in \
+                benchmarkGenerateMesh(bulk_load=bulk_load):
+            print('{0:>10} {1:>6} {2:>8} {3:>12.3f} {4:>10.3f} {5:>12.3f}'.format(
+                'bulk' if bulk_load else 'per node', '{0}x{0}'.format(nodes_count), nodes_count ** 2,
+                generate_seconds, update_seconds, geometry_seconds))
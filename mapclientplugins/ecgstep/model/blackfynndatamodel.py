@@ -3,20 +3,46 @@
 # BlackfynnDataModel is a class used to store API keys of users who log in and use them to access the
 # blackfynn-python API. http://help.blackfynn.com/developer-tools
 
-from blackfynn import Blackfynn
-from natsort import natsorted
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from blackfynn import Blackfynn
+except ImportError:
+    Blackfynn = None
+
+from mapclientplugins.ecgstep.model.channeldata import ChannelData
+from mapclientplugins.ecgstep.model.chunkbuffer import ChunkBuffer
+from mapclientplugins.ecgstep.model.clientpool import ClientPool
+from mapclientplugins.ecgstep.model.timeseriescache import TimeseriesCache
+
+
+class DownloadCancelled(Exception):
+    pass
 
 
 class BlackfynnDataModel(object):
 
-    def __init__(self):
+    def __init__(self, client_factory=Blackfynn):
+        # client_factory lets a local stand-in for the Blackfynn client be used in place of the real service, and is
+        # required when the blackfynn package is not installed
         self._settings = {'active-profile': ''}
         self._cache = {}
+        self._package_index = {}
         self._bf = None
+        self._client_pool = ClientPool(client_factory)
         self._extra_length = 4
+        self._sample_rates = {}
+        self._rate_detection_rows = 100
+        self._default_samples_per_second = 1000
+        self._timeseries_cache = TimeseriesCache()
 
     def addProfile(self, profile):
         self._settings[profile['name']] = {'api_token': profile['token'], 'api_secret': profile['secret']}
+        self._client_pool.invalidate(profile['name'])
 
     def setActiveProfile(self, profile_name):
         self._settings['active-profile'] = profile_name
@@ -29,13 +55,31 @@ class BlackfynnDataModel(object):
         profile_names.remove('active-profile')
         return profile_names
 
+    def setCacheDirectory(self, directory):
+        self._timeseries_cache.setDirectory(directory)
+
+    def setCacheMaximumSize(self, maximum_size):
+        # setCacheMaximumSize: Sets the bytes the disk cache may take before its least recently used entries go
+        self._timeseries_cache.setMaximumSize(maximum_size)
+
+    def clearTimeseriesCache(self):
+        self._timeseries_cache.clear()
+        self._sample_rates = {}
+
     def _getBlackfynn(self, profile_name):
         api_key = self._settings[profile_name]['api_token']
         api_secret = self._settings[profile_name]['api_secret']
         # print('[{0}]:[{1}]'.format(api_key, api_secret))
-        self._bf = Blackfynn(api_token=api_key, api_secret=api_secret)
+        self._bf = self._client_pool.getClient(profile_name, api_key, api_secret)
         return self._bf
 
+    def setClientTimeToLive(self, time_to_live):
+        # setClientTimeToLive: Sets how many seconds a pooled client is reused before authenticating again
+        self._client_pool.setTimeToLive(time_to_live)
+
+    def resetClients(self):
+        self._client_pool.invalidate()
+
     def getDatasets(self, profile_name, refresh=False):
         if profile_name in self._cache and not refresh:
             datasets = self._cache[profile_name]['datasets']
@@ -58,58 +102,296 @@ class BlackfynnDataModel(object):
             bf = self._getBlackfynn(profile_name)
             dataset = bf.get_dataset(dataset_name)
             self._cache[profile_name][dataset_name] = dataset
+            self._indexPackages(profile_name, dataset_name)
         else:
             dataset = []
 
         return dataset
 
-    def getTimeseriesData(self, profile_name, dataset_name, timeseries_name, length):
-        for stored_dataset in self._cache[profile_name][dataset_name]:
-            if stored_dataset.name == timeseries_name:
-                if stored_dataset.type == 'TimeSeries':
-                    return  self.proecessTimeseriesData(stored_dataset, length)
-                if stored_dataset.type == 'Tabular':
-                    return  self.proecessTabularData(stored_dataset, length)
+    def prefetchDataset(self, profile_name, dataset_name, length=None, progress_callback=None, is_cancelled=None,
+                        package_names=None, chunk_length=None):
+        # prefetchDataset: Retrieves a dataset's package listing into the cache. When a length is given and the disk
+        #                  cache is enabled, the first window of each package in package_names is fetched as well so
+        #                  the later requests for them are served locally. Only the listing is refreshed when no
+        #                  package names are given. chunk_length (seconds) streams each window so cancelling takes
+        #                  effect within a package. Returns (profile_name, dataset_name).
+        self.getDataset(profile_name, dataset_name, refresh=package_names is None)
+        if length is not None and package_names and self._timeseries_cache.isEnabled():
+            for package_index, package_name in enumerate(package_names):
+                if is_cancelled is not None and is_cancelled():
+                    raise DownloadCancelled()
+                self.getTimeseriesData(profile_name, dataset_name, package_name, length, chunk_length=chunk_length,
+                                       is_cancelled=is_cancelled)
+                if progress_callback is not None:
+                    progress_callback(package_index + 1, len(package_names))
+
+        return profile_name, dataset_name
+
+    def getTimeseriesData(self, profile_name, dataset_name, timeseries_name, length, chunk_length=None,
+                          progress_callback=None, is_cancelled=None, start_time=0.0, channels=None):
+        # getTimeseriesData: Returns [channel data, relative times] for the window of a package starting start_time
+        #                    seconds into the recording. When chunk_length (seconds) is given the recording is
+        #                    streamed in windows of that length, reporting each window through
+        #                    progress_callback(done, total) and raising DownloadCancelled once is_cancelled() is True.
+        #                    channels optionally lists the channel names to keep, a TimeSeries package only
+        #                    downloads those.
+        stream = None
+        if chunk_length is not None:
+            stream = {'chunk_length': chunk_length,
+                      'progress_callback': progress_callback,
+                      'is_cancelled': is_cancelled}
+        stored_dataset = self._findPackage(profile_name, dataset_name, timeseries_name)
+        if stored_dataset is not None:
+            cache_key = (profile_name, dataset_name, stored_dataset.id)
+            if stored_dataset.type == 'TimeSeries':
+                return  self.proecessTimeseriesData(stored_dataset, length, cache_key, stream, start_time, channels)
+            if stored_dataset.type == 'Tabular':
+                return  self.proecessTabularData(stored_dataset, length, cache_key, stream, start_time, channels)
+
+    def _indexPackages(self, profile_name, dataset_name):
+        # _indexPackages: Walks a cached dataset once to build name -> package and id -> package lookups.
+        #                 The first package with a given name wins, as it did when the dataset was scanned.
+        names = []
+        by_name = {}
+        by_id = {}
+        for package in self._cache[profile_name][dataset_name]:
+            names.append(package.name)
+            by_name.setdefault(package.name, package)
+            by_id[package.id] = package
+        index = {'names': names, 'by_name': by_name, 'by_id': by_id}
+        self._package_index[(profile_name, dataset_name)] = index
+        return index
+
+    def _getPackageIndex(self, profile_name, dataset_name):
+        key = (profile_name, dataset_name)
+        if key in self._package_index:
+            return self._package_index[key]
+
+        return self._indexPackages(profile_name, dataset_name)
+
+    def getDatasetNames(self, profile_name):
+        return [dataset.name for dataset in self.getDatasets(profile_name)]
+
+    def getPackageNames(self, profile_name, dataset_name):
+        return list(self._getPackageIndex(profile_name, dataset_name)['names'])
+
+    def getPackageById(self, profile_name, dataset_name, package_id):
+        return self._getPackageIndex(profile_name, dataset_name)['by_id'].get(package_id)
+
+    def _findPackage(self, profile_name, dataset_name, package_name):
+        return self._getPackageIndex(profile_name, dataset_name)['by_name'].get(package_name)
+
+    def getMultipleTimeseriesData(self, profile_name, dataset_name, timeseries_names, length, channels=None,
+                                  max_workers=4):
+        # getMultipleTimeseriesData: Fetches several packages concurrently and merges them into one time aligned
+        #                            [channel data, relative times]. channels optionally maps a package name to the
+        #                            channel names to keep from it. Tabular times are first put back on the
+        #                            TimeSeries base of seconds from the first sample. The time axis is then that of
+        #                            the first package, the others are shifted by their recording start and
+        #                            interpolated onto it, with NaN at the times a package does not cover.
+        if not timeseries_names:
+            return None
+
+        packages = [self._findPackage(profile_name, dataset_name, name) for name in timeseries_names]
+        unknown_names = [name for name, package in zip(timeseries_names, packages)
+                         if package is None or package.type not in ('TimeSeries', 'Tabular')]
+        if unknown_names:
+            raise ValueError('No TimeSeries or Tabular package named {0} in dataset \'{1}\''.format(
+                ', '.join('\'{0}\''.format(name) for name in unknown_names), dataset_name))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(timeseries_names)))) as executor:
+            futures = [executor.submit(self.getTimeseriesData, profile_name, dataset_name, name, length,
+                                       channels=None if channels is None else channels.get(name))
+                       for name in timeseries_names]
+            outputs = [future.result() for future in futures]
+
+        starts = [getattr(package, 'start', None) if package.type == 'TimeSeries' else None for package in packages]
+        known_starts = [start for start in starts if start is not None]
+        earliest_start = min(known_starts) if known_starts else None
+
+        name_counts = Counter(name for output in outputs for name in output[0].getNames())
+        times = None
+        names = []
+        rows = []
+        for timeseries_name, package, output, start in zip(timeseries_names, packages, outputs, starts):
+            channel_data, package_times = output
+            package_times = np.asarray(package_times, dtype=np.float64)
+            if package.type == 'Tabular':
+                # proecessTabularData starts its times half the extra length before the first sample
+                package_times = package_times + self._extra_length/2
+            if start is not None:
+                # Package start times are in microseconds
+                package_times = package_times + (start - earliest_start) / 1e6
 
-    def proecessTimeseriesData(self, stored_dataset, length):
-        timeseries_dframe = stored_dataset.get_data(length='{0}s'.format(length + self._extra_length))
+            matrix = channel_data.getMatrix()
+            if times is None:
+                times = package_times
+            elif len(package_times) != len(times) or not np.allclose(package_times, times):
+                matrix = np.array([np.interp(times, package_times, row, left=np.nan, right=np.nan)
+                                   for row in matrix]).reshape(-1, len(times))
+
+            for name in channel_data.getNames():
+                # Keep channel names unique when packages use the same electrode names
+                names.append('{0}/{1}'.format(timeseries_name, name) if name_counts[name] > 1 else name)
+            rows.append(matrix)
+
+        return [ChannelData(names, np.vstack(rows)), times]
+
+    def _getDataFrame(self, stored_dataset, cache_key, window, fetch):
+        # _getDataFrame: Calls fetch for a package's data frame, going through the disk cache when a cache_key is
+        #                given. The package's modified stamp is stored with each entry so edits on Blackfynn are
+        #                picked up.
+        if cache_key is None:
+            return fetch()
+
+        key = cache_key + (window,)
+        modified = getattr(stored_dataset, 'updated_at', None)
+        data_frame = self._timeseries_cache.load(key, modified)
+        if data_frame is None:
+            data_frame = fetch()
+            self._timeseries_cache.store(key, modified, data_frame)
+
+        return data_frame
+
+    def _fetchChunks(self, fetch_chunk, chunk_arguments, stream, drop_overlap):
+        # _fetchChunks: Calls fetch_chunk for each set of arguments and collects the chunks in a preallocated buffer
+        progress_callback = stream['progress_callback']
+        is_cancelled = stream['is_cancelled']
+        number_of_chunks = len(chunk_arguments)
+        buffer = ChunkBuffer(number_of_chunks, drop_overlap)
+        for chunk_index, arguments in enumerate(chunk_arguments):
+            if is_cancelled is not None and is_cancelled():
+                raise DownloadCancelled()
+            buffer.append(fetch_chunk(**arguments))
+            if progress_callback is not None:
+                progress_callback(chunk_index + 1, number_of_chunks)
+
+        return buffer.toDataFrame()
+
+    def _fetchTimeseries(self, stored_dataset, start_time, window, stream, channels=None):
+        # Package start and end times are in microseconds. channels is a list of the package's channel objects to
+        # download, or None for all of them.
+        start = stored_dataset.start + int(start_time * 1e6)
+        if stream is None:
+            return stored_dataset.get_data(start=start, length='{0}s'.format(window), channels=channels)
+
+        end = min(start + int(window * 1e6), stored_dataset.end)
+        chunk_usecs = int(stream['chunk_length'] * 1e6)
+        chunk_arguments = [{'start': chunk_start, 'end': min(chunk_start + chunk_usecs, end), 'channels': channels}
+                           for chunk_start in range(start, end, chunk_usecs)]
+        return self._fetchChunks(stored_dataset.get_data, chunk_arguments, stream, True)
+
+    def _fetchTabular(self, stored_dataset, first_row, number_of_rows, number_of_samples_per_second, stream):
+        if stream is None:
+            return stored_dataset.get_data(limit=number_of_rows, offset=first_row)
+
+        chunk_rows = max(int(stream['chunk_length'] * number_of_samples_per_second), 1)
+        end_row = first_row + number_of_rows
+        chunk_arguments = [{'limit': min(chunk_rows, end_row - offset), 'offset': offset}
+                           for offset in range(first_row, end_row, chunk_rows)]
+        return self._fetchChunks(stored_dataset.get_data, chunk_arguments, stream, False)
+
+    def _detectSampleRate(self, stored_dataset, cache_key=None):
+        # _detectSampleRate: Returns the samples per second of a Tabular package. A 'sampling_rate' property is used
+        #                    when the package has one, otherwise the spacing of the times in the first rows. Tables
+        #                    without any times fall back to the millisecond spacing assumed previously. With a
+        #                    cache_key the rate is kept in the disk cache beside the package's data, so cached data
+        #                    is found without asking Blackfynn for the rate again.
+        modified = getattr(stored_dataset, 'updated_at', None)
+        rate_key = (stored_dataset.id, str(modified))
+        if rate_key in self._sample_rates:
+            return self._sample_rates[rate_key]
+
+        if cache_key is not None:
+            number_of_samples_per_second = self._timeseries_cache.loadSampleRate(cache_key, modified)
+            if number_of_samples_per_second is not None:
+                self._sample_rates[rate_key] = number_of_samples_per_second
+                return number_of_samples_per_second
+
+        number_of_samples_per_second = None
+        get_property = getattr(stored_dataset, 'get_property', None)
+        if get_property is not None:
+            try:
+                sampling_rate = get_property('sampling_rate')
+                if sampling_rate is not None:
+                    number_of_samples_per_second = float(sampling_rate.value)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                number_of_samples_per_second = None
+
+        if number_of_samples_per_second is None:
+            first_rows = stored_dataset.get_data(limit=self._rate_detection_rows, offset=0)
+            times = None
+            if isinstance(first_rows.index, pd.DatetimeIndex):
+                times = first_rows.index
+            else:
+                for key in first_rows.keys():
+                    if 'time' in key and np.issubdtype(first_rows[key].dtype, np.datetime64):
+                        times = pd.DatetimeIndex(first_rows[key])
+                        break
+            if times is not None and len(times) > 1:
+                spacing = np.median(np.diff(times.values.astype('datetime64[ns]').astype(np.int64)))
+                if spacing > 0:
+                    number_of_samples_per_second = 1e9 / spacing
+
+        if number_of_samples_per_second is None:
+            number_of_samples_per_second = self._default_samples_per_second
+
+        self._sample_rates[rate_key] = number_of_samples_per_second
+        if cache_key is not None:
+            self._timeseries_cache.storeSampleRate(cache_key, modified, number_of_samples_per_second)
+        return number_of_samples_per_second
+
+    def proecessTimeseriesData(self, stored_dataset, length, cache_key=None, stream=None, start_time=0.0,
+                               channels=None):
+        window = length + self._extra_length
+        window_key = '{0}s+{1}s'.format(start_time, window)
+        selected_channels = None
+        if channels is not None:
+            # Only the selected channels are downloaded, and they are cached apart from the whole package
+            selected_channels = [channel for channel in stored_dataset.channels if channel.name in channels]
+            window_key += '|' + ','.join(sorted(channel.id for channel in selected_channels))
+        timeseries_dframe = self._getDataFrame(stored_dataset, cache_key, window_key,
+                                               lambda: self._fetchTimeseries(stored_dataset, start_time, window,
+                                                                             stream, selected_channels))
         cache_output = self._create_file_cache(timeseries_dframe)
-        absolute_timeseries_values = timeseries_dframe.axes[0]
-        relative_times = []
-        for time in absolute_timeseries_values:
-            relative_times.append(round(time.timestamp() - absolute_timeseries_values[0].timestamp(), 6))
+        relative_times = self._relativeTimes(timeseries_dframe.index)
         return [cache_output, relative_times]
 
-    def proecessTabularData(self, stored_dataset, length):
-        # length here is the video length passed from the video length
-
-        # TODO: categorise tabular data to find timescales
-        # Note that the below assumes data is spaced in milliseconds!
-        number_of_samples_per_second = 1000
+    def proecessTabularData(self, stored_dataset, length, cache_key=None, stream=None, start_time=0.0,
+                            channels=None):
+        # length here is the video length passed from the video length, only the rows from start_time to the end
+        # of the video plus the extra length are fetched
+        number_of_samples_per_second = self._detectSampleRate(stored_dataset, cache_key)
+        first_row = int(start_time*number_of_samples_per_second)
         number_of_rows = int((length + self._extra_length)*number_of_samples_per_second)
-        timeseries_dframe =stored_dataset.get_data(number_of_rows)
+        timeseries_dframe = self._getDataFrame(stored_dataset, cache_key,
+                                               '{0}+{1}rows'.format(first_row, number_of_rows),
+                                               lambda: self._fetchTabular(stored_dataset, first_row, number_of_rows,
+                                                                          number_of_samples_per_second, stream))
 
-        absolute_timeseries_values = timeseries_dframe.axes[0]
-        relative_times = []
-        if str(type(absolute_timeseries_values[0])) == "<class 'pandas._libs.tslibs.timestamps.Timestamp'>":
-            for time in absolute_timeseries_values:
-                relative_times.append(round(time.timestamp() - absolute_timeseries_values[0].timestamp(), 6) - self._extra_length/2)
-        else:
-            for time_sample in absolute_timeseries_values:
-                relative_times.append(time_sample/number_of_samples_per_second - self._extra_length/2)
+        relative_times = self._relativeTimes(timeseries_dframe.index, number_of_samples_per_second)
+        relative_times -= self._extra_length/2
+        if channels is not None:
+            # Tables are fetched by rows only, so the channels are picked out afterwards
+            timeseries_dframe = timeseries_dframe[[key for key in timeseries_dframe.keys() if key in channels]]
 
         cache_output = self._create_file_cache(timeseries_dframe)
         return [cache_output, relative_times]
 
-    def _create_file_cache(self, data_frame):
+    def _relativeTimes(self, index, number_of_samples_per_second=1):
+        # _relativeTimes: Returns the times of a data frame index in seconds from the first sample as a float64 array.
+        #                 A DatetimeIndex is read as int64 nanoseconds, any other index is taken as consecutive
+        #                 samples at number_of_samples_per_second.
+        if isinstance(index, pd.DatetimeIndex):
+            nanoseconds = index.values.astype('datetime64[ns]').astype(np.int64)
+            return np.round((nanoseconds - nanoseconds[0]) / 1e9, 6)
 
-        cache_dictionary = {}
-        keys = natsorted(data_frame.keys()) # Sort the keys in 'natural' order
-        for key in keys:
-            if 'time' not in key:
-                cache_dictionary[key] = data_frame[key].values.tolist()
+        return np.arange(len(index), dtype=np.float64) / number_of_samples_per_second
 
-        return cache_dictionary
+    def _create_file_cache(self, data_frame):
+        # _create_file_cache: Returns the channels of data_frame as a (channels x samples) ChannelData matrix,
+        #                     which can still be read like the old channel name -> values dictionary
+        return ChannelData.fromDataFrame(data_frame)
 
     def uploadRender(self, filePath):
         # uploadRender: Takes a given file path and uploads it to blackfynn in a folder called 'Zinc Exports' for the
@@ -4,68 +4,362 @@ blackfynn mesh takes an input of ECG points and renders it to apply our data fro
 This file is modified from 'meshtype_2d_plate1.py' created by Richard Christie.
 
 """
+import io
+
 import numpy as np
 
 from opencmiss.zinc.element import Element, Elementbasis
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.node import Node
 from opencmiss.zinc.glyph import Glyph
+from opencmiss.zinc.streamregion import StreaminformationRegion
+from opencmiss.zinc.status import OK as ZINC_OK
+from mapclientplugins.ecgstep.model.electrodeinterpolation import ElectrodeInterpolation
 from mapclientplugins.ecgstep.model.meshalignmentmodel import MeshAlignmentModel
 
+# Node field definitions for the EX buffers used to load node parameters in bulk, they must match the node templates
+# generate_mesh defines so reading them only sets values
+_EX_NODES_HEADER = 'EX Version: 2\nRegion: /\n!#nodeset nodes\nShape. Dimension=0\n#Fields=1\n{0}'
+_EX_COORDINATES_FIELD = '1) coordinates, coordinate, rectangular cartesian, real, #Components=3\n' + \
+                        ''.join(' {0}. #Values=3 (value,d/ds1,d/ds2)\n'.format(name) for name in 'xyz')
+_EX_COLOUR_FIELD = '1) colour2, field, rectangular cartesian, real, #Components=1\n 1. #Values=1 (value)\n'
+
+
+def _write_node_values_ex(field_definition, node_identifiers, values):
+    """
+    Returns an EX buffer giving one field's (nodes x values) parameters for the listed nodes, values in the order of
+    the field definition.
+    """
+    buffer = io.BytesIO()
+    buffer.write(_EX_NODES_HEADER.format(field_definition).encode('utf-8'))
+    rows = np.column_stack((node_identifiers, values))
+    np.savetxt(buffer, rows, fmt='Node: %d\n' + ''.join([' %.17g'] * values.shape[1]))
+    return buffer.getvalue()
+
 
 class BlackfynnMesh(MeshAlignmentModel):
     """
     BlackfynnMesh is the central point for generating the model for our mesh and drawing it
     """
 
-    def __init__(self, region, time_based_node_description):
+    def __init__(self, region, time_based_node_description, name='ecg_elements', first_node_identifier=0):
         super(BlackfynnMesh, self).__init__()
+        # Several named meshes can share the ecg_plane region, each with its own group, graphics and block of node
+        # and element identifiers starting at first_node_identifier
+        self._name = name
+        self._first_node_identifier = first_node_identifier
         self._mesh_group = []
+        self._nodeset_group = None
+        self._field_group = None
         self._field_element_group = None
         self._coordinates = None
+        self._colour = None
+        self._number_of_nodes = 0
         self._data_time_sequence = []
         self._data = []
-
-        ecg_region = region.findChildByName('ecg_plane')
-        if ecg_region.isValid():
-            region.removeChild(ecg_region)
-
-        self._region = region.createChild('ecg_plane')
+        self._node_data = None
+        self._electrode_positions = None
+        self._electrode_rows = None
+        self._interpolation = None
+        self._bulk_load = False
+        self._node_template = None
+        self._element_template = None
+        self._eft = None
+        self._eft_bi_linear = None
+        self._node_time_sequence = None
+
+        # The region is kept from earlier meshes with its fields, nodes, elements and graphics, and generate_mesh
+        # only redefines what has changed
+        self._region = region.findChildByName('ecg_plane')
+        if not self._region.isValid():
+            self._region = region.createChild('ecg_plane')
         self._time_based_node_description = time_based_node_description
+        self._elements_count_across, self._elements_count_up = \
+            self._grid_size_from_description(time_based_node_description)
 
         # Note that these are normally changed before generating the mesh
 
+    @staticmethod
+    def _grid_size_from_description(time_based_node_description):
+        # The scaffold description may give the number of elements across and up the plate, otherwise a square
+        # plate is assumed from the number of nodes it describes, as the original 8x8 node plate was
+        if 'elements_count_across' in time_based_node_description:
+            elements_count_across = int(time_based_node_description['elements_count_across'])
+            elements_count_up = int(time_based_node_description.get('elements_count_up', elements_count_across))
+            return elements_count_across, elements_count_up
+
+        number_of_nodes = sum(1 for key in time_based_node_description if key.isdigit())
+        nodes_count_across = int(round(np.sqrt(number_of_nodes)))
+        if nodes_count_across > 1 and nodes_count_across * nodes_count_across == number_of_nodes:
+            return nodes_count_across - 1, nodes_count_across - 1
+        return 7, 7
+
+    def get_name(self):
+        return self._name
+
+    def get_region(self):
+        return self._region
+
+    def get_first_node_identifier(self):
+        return self._first_node_identifier
+
+    def get_node_identifiers(self):
+        return np.arange(self._first_node_identifier, self._first_node_identifier + self._number_of_nodes)
+
+    def set_grid_size(self, elements_count_across, elements_count_up):
+        self._elements_count_across = elements_count_across
+        self._elements_count_up = elements_count_up
+
+    def get_grid_size(self):
+        return self._elements_count_across, self._elements_count_up
+
+    def set_bulk_load(self, state):
+        # set_bulk_load: Loads node parameters by reading an EX buffer per time, or by setting them node by node and
+        #                time by time through the field cache (the default). Both give the same parameters, see
+        #                tests/test_blackfynnmesh.py, but writing and parsing the EX text is the slower of the two.
+        self._bulk_load = state
+
+    def _read_node_values(self, field_definition, times, values_at_times):
+        # Reads every time's (nodes x values) parameters in one region read, the nodes must already have the field
+        # defined with these times in its time sequence
+        node_identifiers = self.get_node_identifiers()
+        stream_information = self._region.createStreaminformationRegion()
+        buffers = []
+        for time, values in zip(times, values_at_times):
+            buffers.append(_write_node_values_ex(field_definition, node_identifiers, values))
+            resource = stream_information.createStreamresourceMemoryBuffer(buffers[-1])
+            stream_information.setResourceAttributeReal(resource, StreaminformationRegion.ATTRIBUTE_TIME, time)
+        if self._region.read(stream_information) != ZINC_OK:
+            raise RuntimeError('Could not read the node parameters of {0}'.format(self._name))
+
+    def _read_coordinates(self):
+        node_time_sequence = self._time_based_node_description['time_array']
+        positions = np.array([self._time_based_node_description['{0}'.format(node_identifier)]
+                              for node_identifier in range(self._number_of_nodes)], dtype=np.float64)
+        # Values are (value, d/ds1, d/ds2) for each of x, y and z, the derivatives are left at zero
+        values = np.zeros((self._number_of_nodes, 9))
+        values_at_times = []
+        for index in range(len(node_time_sequence)):
+            values[:, 0::3] = positions[:, index, :]
+            values_at_times.append(values.copy())
+        self._read_node_values(_EX_COORDINATES_FIELD, node_time_sequence, values_at_times)
+
+    def _read_colours(self):
+        self._read_node_values(_EX_COLOUR_FIELD, self._data_time_sequence,
+                               [self._node_data[:, index:index + 1] for index in range(len(self._data_time_sequence))])
+
     def set_data_time_sequence(self, data_time_sequence):
         self._data_time_sequence = data_time_sequence
 
     def set_data(self, data):
         self._data = data
 
-    def generate_mesh(self):
+    def set_electrode_positions(self, electrode_positions, electrode_rows=None):
+        """
+        set_electrode_positions: Colours nodes by interpolating the electrodes nearest them instead of assigning
+        channels to nodes in order. Positions are in the frame of the node positions at the first time, and
+        electrode_rows gives the data row of each electrode. Pass None to go back to assigning channels in order.
         """
-        generateMesh: This is where all points, elements, and colour fields relating to them are defined
+        self._electrode_positions = electrode_positions
+        self._electrode_rows = electrode_rows
+        self._interpolation = None
+
+    def _get_interpolation(self):
+        # The weights are built once for the mesh nodes and reused for every data update
+        if self._electrode_positions is None:
+            return None
+        if self._interpolation is None or self._interpolation.getNumberOfNodes() != self._number_of_nodes:
+            node_positions = [self._time_based_node_description['{0}'.format(node_identifier)][0]
+                              for node_identifier in range(self._number_of_nodes)]
+            self._interpolation = ElectrodeInterpolation(node_positions, self._electrode_positions,
+                                                         self._electrode_rows)
+        return self._interpolation
+
+    def _update_node_data(self):
+        # Every node's colour at every data time, as one (nodes x times) matrix
+        data = np.asarray(self._data, dtype=np.float64)
+        interpolation = self._get_interpolation()
+        if len(data) == 0:
+            self._node_data = np.zeros((self._number_of_nodes, len(self._data_time_sequence)))
+        elif interpolation is not None:
+            self._node_data = interpolation.interpolate(data)
+        else:
+            self._node_data = data[np.arange(self._number_of_nodes) % len(data)]
+
+    def is_generated(self):
+        return self._colour is not None
+
+    def update_data(self, data, data_time_sequence=None):
         """
-        coordinate_dimensions = 3
-        # self.number_points = len(self._node_coordinate_list)
+        update_data: Rewrites only the colour values of a generated mesh, and the colour time sequence if it has
+        changed, leaving the region, nodes, elements, coordinates and graphics in place
+        """
+        field_module = self._region.getFieldmodule()
+        field_module.beginChange()
+        if data_time_sequence is not None and not np.array_equal(data_time_sequence, self._data_time_sequence):
+            self._data_time_sequence = data_time_sequence
+            self._merge_time_sequence(field_module, self._colour, data_time_sequence)
 
-        # We currently find the number of elements by taking the square root of the number of given points
-        elements_count_across = 7
-        elements_count_up = 7
-        use_cross_derivatives = 0
+        self._data = data
+        self._update_node_data()
+        self._load_colours(field_module)
+        field_module.endChange()
+
+    def update_geometry(self, time_based_node_description):
+        """
+        update_geometry: Sets new node positions, and the coordinates time sequence if it has changed, leaving the
+        colour values in place. A description with a different grid size generates the mesh again.
+        """
+        grid_size = self._grid_size_from_description(time_based_node_description)
+        previous_time_sequence = self._time_based_node_description['time_array']
+        self._time_based_node_description = time_based_node_description
+        if not self.is_generated() or grid_size != self.get_grid_size():
+            self.set_grid_size(*grid_size)
+            if self.is_generated():
+                self.generate_mesh()
+            return
 
-        # Set up our coordinate field
         field_module = self._region.getFieldmodule()
         field_module.beginChange()
-        coordinates = field_module.createFieldFiniteElement(coordinate_dimensions)
-        coordinates.setName('coordinates')
-        coordinates.setManaged(True)
-        coordinates.setTypeCoordinate(True)
-        coordinates.setCoordinateSystemType(Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN)
-        coordinates.setComponentName(1, 'x')
-        coordinates.setComponentName(2, 'y')
-        if coordinate_dimensions == 3:
+        node_time_sequence = time_based_node_description['time_array']
+        if not np.array_equal(node_time_sequence, previous_time_sequence):
+            self._merge_time_sequence(field_module, self._coordinates, node_time_sequence, derivatives=True)
+        self._load_coordinates(field_module)
+        if self._electrode_positions is not None:
+            # Interpolation weights follow the node positions, so the colours are interpolated again
+            self._interpolation = None
+            self._update_node_data()
+            self._load_colours(field_module)
+        field_module.endChange()
+
+    def _merge_time_sequence(self, field_module, field, time_sequence, derivatives=False):
+        # Redefines one field on every node of this mesh with a new time sequence, keeping the rest of the node
+        # definition. derivatives adds the d/ds1 and d/ds2 values the coordinates have
+        nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        zinc_time_sequence = field_module.getMatchingTimesequence(list(time_sequence))
+        node_template = nodes.createNodetemplate()
+        node_template.defineField(field)
+        node_template.setValueNumberOfVersions(field, -1, Node.VALUE_LABEL_VALUE, 1)
+        if derivatives:
+            node_template.setValueNumberOfVersions(field, -1, Node.VALUE_LABEL_D_DS1, 1)
+            node_template.setValueNumberOfVersions(field, -1, Node.VALUE_LABEL_D_DS2, 1)
+        node_template.setTimesequence(field, zinc_time_sequence)
+        for node_identifier in self.get_node_identifiers():
+            nodes.findNodeByIdentifier(int(node_identifier)).merge(node_template)
+        # Keep the template for new grids in step with the nodes
+        self._node_template.setTimesequence(field, zinc_time_sequence)
+        self._node_time_sequence = None
+
+    def _load_coordinates(self, field_module):
+        if self._bulk_load:
+            self._read_coordinates()
+            return
+        nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        cache = field_module.createFieldcache()
+        for node_index, node_identifier in enumerate(self.get_node_identifiers()):
+            cache.setNode(nodes.findNodeByIdentifier(int(node_identifier)))
+            self._set_node_coordinates(cache, node_index)
+
+    def _load_colours(self, field_module):
+        if self._bulk_load:
+            self._read_colours()
+            return
+        nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        cache = field_module.createFieldcache()
+        for node_index, node_identifier in enumerate(self.get_node_identifiers()):
+            cache.setNode(nodes.findNodeByIdentifier(int(node_identifier)))
+            self._set_node_colours(cache, node_index)
+
+    def _set_node_coordinates(self, cache, node_index):
+        # Assign a node its position for each time step, the field cache must already be set to the node. Node
+        # indexes count from the mesh's first node as the scaffold description does
+        node_locations = self._time_based_node_description['{0}'.format(node_index)]
+        for index, time in enumerate(self._time_based_node_description['time_array']):
+            cache.setTime(time)
+            self._coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, node_locations[index])
+
+    def _set_node_colours(self, cache, node_index):
+        # Assign a node its colour for each time step, the field cache must already be set to the node
+        colour_values = self._node_data[node_index]
+        for index, time in enumerate(self._data_time_sequence):
+            cache.setTime(time)
+            self._colour.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, float(colour_values[index]))
+
+    def has_node(self, node_identifier):
+        return 0 <= node_identifier - self._first_node_identifier < self._number_of_nodes
+
+    def get_channel_index_for_node(self, node_identifier):
+        # get_channel_index_for_node: Returns the index of the data row that contributes most to a node's colour
+        if len(self._data) == 0 or not self.has_node(node_identifier):
+            return None
+        node_index = node_identifier - self._first_node_identifier
+        interpolation = self._get_interpolation()
+        if interpolation is not None:
+            return interpolation.getNearestRow(node_index)
+        return node_index % len(self._data)
+
+    def _define_fields(self, field_module):
+        # Finds the coordinates and colour fields of an earlier mesh in the region, or creates them
+        coordinates = field_module.findFieldByName('coordinates').castFiniteElement()
+        if not coordinates.isValid():
+            coordinates = field_module.createFieldFiniteElement(3)
+            coordinates.setName('coordinates')
+            coordinates.setManaged(True)
+            coordinates.setTypeCoordinate(True)
+            coordinates.setCoordinateSystemType(Field.COORDINATE_SYSTEM_TYPE_RECTANGULAR_CARTESIAN)
+            coordinates.setComponentName(1, 'x')
+            coordinates.setComponentName(2, 'y')
             coordinates.setComponentName(3, 'z')
 
+        # Create our spectrum colour field
+        colour = field_module.findFieldByName('colour2').castFiniteElement()
+        if not colour.isValid():
+            colour = field_module.createFieldFiniteElement(1)
+            colour.setName('colour2')
+            colour.setManaged(True)
+
+        self._coordinates = coordinates
+        self._colour = colour
+
+    def share_definitions(self, other):
+        """
+        share_definitions: Uses the fields and node and element templates of another mesh in the same region
+        instead of making new ones, so meshes added to a region are only given their own group
+        """
+        self._coordinates = other._coordinates
+        self._colour = other._colour
+        self._node_template = other._node_template
+        self._element_template = other._element_template
+        self._eft = other._eft
+        self._eft_bi_linear = other._eft_bi_linear
+
+    def _define_group(self, field_module):
+        # Find or create the group holding this mesh's nodes and elements
+        nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        mesh = field_module.findMeshByDimension(2)
+        fieldGroup = field_module.findFieldByName(self._name).castGroup()
+        if not fieldGroup.isValid():
+            fieldGroup = field_module.createFieldGroup()
+            fieldGroup.setName(self._name)
+            fieldGroup.setManaged(True)
+        fieldNodeGroup = fieldGroup.getFieldNodeGroup(nodes)
+        if not fieldNodeGroup.isValid():
+            fieldNodeGroup = fieldGroup.createFieldNodeGroup(nodes)
+        fieldElementGroup = fieldGroup.getFieldElementGroup(mesh)
+        if not fieldElementGroup.isValid():
+            fieldElementGroup = fieldGroup.createFieldElementGroup(mesh)
+
+        self._field_group = fieldGroup
+        self._nodeset_group = fieldNodeGroup.getNodesetGroup()
+        self._mesh_group = fieldElementGroup.getMeshGroup()
+        self._field_element_group = fieldElementGroup
+
+    def _define_templates(self, field_module):
+        # Node and element templates are made once per region and reused by every generate_mesh of every mesh
+        use_cross_derivatives = 0
+        coordinates = self._coordinates
+        colour = self._colour
+
         # Set up our node template
         nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
         node_template = nodes.createNodetemplate()
@@ -78,47 +372,85 @@ class BlackfynnMesh(MeshAlignmentModel):
 
         mesh = field_module.findMeshByDimension(2)
 
-        # Create our mesh subgroup
-        fieldGroup = field_module.createFieldGroup()
-        fieldElementGroup = fieldGroup.createFieldElementGroup(mesh)
-        fieldElementGroup.setManaged(True)
-        meshGroup = fieldElementGroup.getMeshGroup()
-
         # Define our interpolation
         bicubicHermiteBasis = field_module.createElementbasis(2, Elementbasis.FUNCTION_TYPE_CUBIC_HERMITE)
         bilinearBasis = field_module.createElementbasis(2, Elementbasis.FUNCTION_TYPE_LINEAR_LAGRANGE)
 
         # Set up our element templates
-        eft = meshGroup.createElementfieldtemplate(bicubicHermiteBasis)
-        eft_bi_linear = meshGroup.createElementfieldtemplate(bilinearBasis)
+        eft = mesh.createElementfieldtemplate(bicubicHermiteBasis)
+        eft_bi_linear = mesh.createElementfieldtemplate(bilinearBasis)
         if not use_cross_derivatives:
             for n in range(4):
                 eft.setFunctionNumberOfTerms(n*4 + 4, 0)
-        element_template = meshGroup.createElementtemplate()
+        element_template = mesh.createElementtemplate()
         element_template.setElementShapeType(Element.SHAPE_TYPE_SQUARE)
         element_template.defineField(coordinates, -1, eft)
 
-        # Create our spectrum colour field
-        colour = field_module.createFieldFiniteElement(1)
-        colour.setName('colour2')
-        colour.setManaged(True)
-
-        # add time support for colour field
-
         # Create node and element templates for our spectrum colour field
         node_template.defineField(colour)
         node_template.setValueNumberOfVersions(colour, -1, Node.VALUE_LABEL_VALUE, 1)
         element_template.defineField(colour, -1, eft_bi_linear)
 
+        self._node_template = node_template
+        self._element_template = element_template
+        self._eft = eft
+        self._eft_bi_linear = eft_bi_linear
+
+    def _has_grid(self):
+        # Whether the mesh's group already holds the nodes and elements of a grid of the current size
+        number_of_elements = self._elements_count_across * self._elements_count_up
+        last_node_identifier = self._first_node_identifier + self._number_of_nodes - 1
+        return self._nodeset_group.getSize() == self._number_of_nodes and \
+            self._mesh_group.getSize() == number_of_elements and \
+            self._nodeset_group.findNodeByIdentifier(last_node_identifier).isValid()
+
+    def generate_mesh(self):
+        """
+        generateMesh: This is where all points, elements, and colour fields relating to them are defined. Fields,
+        templates, nodes and elements left by an earlier mesh of the same size are reused, so only the node time
+        sequences and parameters are set again.
+        """
+        # The number of elements comes from the scaffold description, see _grid_size_from_description
+        elements_count_across = self._elements_count_across
+        elements_count_up = self._elements_count_up
+        use_cross_derivatives = 0
+
+        field_module = self._region.getFieldmodule()
+        field_module.beginChange()
+        if self._node_template is None:
+            self._define_fields(field_module)
+            self._define_templates(field_module)
+        if self._field_group is None:
+            self._define_group(field_module)
+        coordinates = self._coordinates
+        colour = self._colour
+        node_template = self._node_template
+        nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+
         node_time_sequence = self._time_based_node_description['time_array']
         zinc_node_time_sequence = field_module.getMatchingTimesequence(node_time_sequence)
         node_template.setTimesequence(coordinates, zinc_node_time_sequence)
-        zinc_data_time_sequence = field_module.getMatchingTimesequence(self._data_time_sequence)
+        zinc_data_time_sequence = field_module.getMatchingTimesequence(list(self._data_time_sequence))
         node_template.setTimesequence(colour, zinc_data_time_sequence)
 
-        first_node_number = 0
-
-        # create nodes
+        first_node_number = self._first_node_identifier
+        self._number_of_nodes = (elements_count_across + 1) * (elements_count_up + 1)
+        self._update_node_data()
+
+        if self._has_grid():
+            # Keep the nodes and elements, merging in the template only if a time sequence has changed
+            if self._node_time_sequence != (list(node_time_sequence), list(self._data_time_sequence)):
+                for node_identifier in range(first_node_number, first_node_number + self._number_of_nodes):
+                    nodes.findNodeByIdentifier(node_identifier).merge(node_template)
+            create_grid = False
+        else:
+            # Only this mesh's elements and nodes are destroyed, other meshes in the region are left alone
+            field_module.findMeshByDimension(2).destroyElementsConditional(self._field_group)
+            nodes.destroyNodesConditional(self._field_group)
+            create_grid = True
+        self._node_time_sequence = (list(node_time_sequence), list(self._data_time_sequence))
+
+        # create nodes, or set the parameters of the existing ones
         cache = field_module.createFieldcache()
         node_identifier = first_node_number
         x = [0.0, 0.0, 0.0]
@@ -129,52 +461,88 @@ class BlackfynnMesh(MeshAlignmentModel):
         for n2 in range(elements_count_up + 1):
             for n1 in range(elements_count_across + 1):
 
-                node = nodes.createNode(node_identifier, node_template)
+                if create_grid:
+                    node = nodes.createNode(node_identifier, node_template)
+                    self._nodeset_group.addNode(node)
+                else:
+                    node = nodes.findNodeByIdentifier(node_identifier)
+                if self._bulk_load:
+                    # Positions and colours of all nodes are read in bulk once the nodes exist
+                    node_identifier = node_identifier + 1
+                    continue
+
                 cache.setNode(node)
 
-                node_locations = self._time_based_node_description['{0}'.format(node_identifier)]
                 # Assign the new node its position
-                for index, time in enumerate(node_time_sequence):
-                    cache.setTime(time)
-                    coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, node_locations[index])
+                self._set_node_coordinates(cache, i)
                 # coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
                 # coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
                 if use_cross_derivatives:
                     coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D2_DS1DS2, 1, zero)
 
                 # Assign the new node its colour for each time step
-                for index, time in enumerate(self._data_time_sequence):
-                    cache.setTime(time)
-                    colour_value = self._data[i % len(self._data)][index]
-                    colour.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, colour_value)
+                self._set_node_colours(cache, i)
 
                 node_identifier = node_identifier + 1
                 i += 1
 
+        if self._bulk_load:
+            self._load_coordinates(field_module)
+            self._load_colours(field_module)
+
         # create elements
-        elementIdentifier = first_node_number
-        no2 = (elements_count_across + 1)
-        for e2 in range(elements_count_up):
-            for e1 in range(elements_count_across):
-                element = meshGroup.createElement(elementIdentifier, element_template)
-                bni = e2 * no2 + e1 + first_node_number
-                nodeIdentifiers = [bni, bni + 1, bni + no2, bni + no2 + 1]
-                result = element.setNodesByIdentifier(eft, nodeIdentifiers)
-                result = element.setNodesByIdentifier(eft_bi_linear, nodeIdentifiers)
-                elementIdentifier = elementIdentifier + 1
-
-        # Set fields for later access
-        self._mesh_group = meshGroup
-        self._field_element_group = fieldElementGroup
-        self._coordinates = coordinates
+        if create_grid:
+            elementIdentifier = first_node_number
+            no2 = (elements_count_across + 1)
+            for e2 in range(elements_count_up):
+                for e1 in range(elements_count_across):
+                    element = self._mesh_group.createElement(elementIdentifier, self._element_template)
+                    bni = e2 * no2 + e1 + first_node_number
+                    nodeIdentifiers = [bni, bni + 1, bni + no2, bni + no2 + 1]
+                    result = element.setNodesByIdentifier(self._eft, nodeIdentifiers)
+                    result = element.setNodesByIdentifier(self._eft_bi_linear, nodeIdentifiers)
+                    elementIdentifier = elementIdentifier + 1
 
         field_module.endChange()
 
+    def _get_graphics_names(self):
+        # Names of the lines, node points and surfaces showing this mesh
+        return ['{0}_lines'.format(self._name), '{0}_points'.format(self._name), '{0}_surfaces'.format(self._name)]
+
+    def set_visibility(self, state):
+        # set_visibility: Shows or hides this mesh's graphics, leaving the other meshes in the region as they are
+        scene = self._region.getScene()
+        for graphics_name in self._get_graphics_names():
+            graphics = scene.findGraphicsByName(graphics_name)
+            if graphics.isValid():
+                graphics.setVisibilityFlag(state)
+
+    def is_visible(self):
+        return self._region.getScene().findGraphicsByName(self._get_graphics_names()[0]).getVisibilityFlag()
+
+    def _get_spectrum(self, scene):
+        # All meshes in the region are coloured by the one spectrum, made from the default spectrum by the first
+        spectrum_module = scene.getSpectrummodule()
+        spectrum = spectrum_module.findSpectrumByName('eegColourSpectrum')
+        if spectrum.isValid():
+            return spectrum, False
+        spectrum = spectrum_module.getDefaultSpectrum()
+        spectrum.setName('eegColourSpectrum')
+        return spectrum, True
+
     def drawMesh(self):
 
         scene = self._region.getScene()
         fm = self._region.getFieldmodule()
+        lines_name, points_name, surfaces_name = self._get_graphics_names()
 
+        if scene.findGraphicsByName(lines_name).isValid():
+            # Graphics of an earlier mesh of this name in the region already show the fields generate_mesh reused
+            spectrum, _ = self._get_spectrum(scene)
+            self._spectrum_component = spectrum.getFirstSpectrumcomponent()
+            return
+
+        scene.beginChange()
         coordinates = self._coordinates
         coordinates = coordinates.castFiniteElement()
 
@@ -182,12 +550,15 @@ class BlackfynnMesh(MeshAlignmentModel):
 
         lines = scene.createGraphicsLines()
         lines.setCoordinateField(coordinates)
-        lines.setName('displayLines2')
+        lines.setSubgroupField(self._field_group)
+        lines.setName(lines_name)
         lines.setMaterial(materialModule.findMaterialByName('blue'))
 
         nodePoints = scene.createGraphicsPoints()
         nodePoints.setFieldDomainType(Field.DOMAIN_TYPE_NODES)
         nodePoints.setCoordinateField(coordinates)
+        nodePoints.setSubgroupField(self._field_group)
+        nodePoints.setName(points_name)
         nodePoints.setMaterial(materialModule.findMaterialByName('blue'))
         nodePoints.setVisibilityFlag(True)
 
@@ -199,19 +570,20 @@ class BlackfynnMesh(MeshAlignmentModel):
 
         surfaces = scene.createGraphicsSurfaces()
         surfaces.setCoordinateField(coordinates)
+        surfaces.setSubgroupField(self._field_group)
+        surfaces.setName(surfaces_name)
         surfaces.setVisibilityFlag(True)
 
         colour = fm.findFieldByName('colour2')
         colour = colour.castFiniteElement()
 
         # Add Spectrum
-        spcmod = scene.getSpectrummodule()
-        spec = spcmod.getDefaultSpectrum()
-        spec.setName('eegColourSpectrum')
+        spec, created = self._get_spectrum(scene)
         spcc = spec.getFirstSpectrumcomponent()
 
-        spcc.setRangeMaximum(1)
-        spcc.setRangeMinimum(0)
+        if created:
+            spcc.setRangeMaximum(1)
+            spcc.setRangeMinimum(0)
         self._spectrum_component = spcc
 
         # Set attributes for our mesh
@@ -267,16 +639,6 @@ class BlackfynnMesh(MeshAlignmentModel):
 
 
 
-    def initialiseSpectrumFromDictionary(self, data):
-        min = data[next(iter(data))][0]
-        max = min
-        for key in data:
-            row_max = np.max(data[key])
-            row_min = np.min(data[key])
-            if row_min < min:
-                min = row_min
-            if row_max > max:
-                max = row_max
-
-        self._spectrum_component.setRangeMaximum(max)
-        self._spectrum_component.setRangeMinimum(min)
+    def set_spectrum_range(self, minimum, maximum):
+        self._spectrum_component.setRangeMaximum(maximum)
+        self._spectrum_component.setRangeMinimum(minimum)
@@ -0,0 +1,87 @@
+# channeldata.py
+# --------------
+# ChannelData holds every channel of a recording in one (channels x samples) float array with a natsorted list of
+# channel names. It behaves like the read only dictionary of channel name -> values that it replaces, so existing
+# code can keep using data['cache'][key] while new code works on the matrix directly.
+
+import numpy as np
+from natsort import natsorted
+
+from mapclientplugins.ecgstep.model.quantilesketch import QuantileSketch
+
+
+class ChannelData(object):
+
+    # Above this many values percentiles are estimated a channel at a time with a QuantileSketch
+    _exact_percentile_limit = 50000000
+
+    def __init__(self, names, matrix):
+        self._names = list(names)
+        self._matrix = matrix
+        self._indices = {name: index for index, name in enumerate(self._names)}
+        self._ranges = {}
+
+    @classmethod
+    def fromDataFrame(cls, data_frame):
+        names = natsorted([key for key in data_frame.keys() if 'time' not in key])  # Sort in 'natural' order
+        if names == list(data_frame.columns):
+            # Columns are already in order so a single float block can be shared with the data frame
+            values = data_frame.values
+        else:
+            values = data_frame[names].values
+        if not np.issubdtype(values.dtype, np.floating):
+            values = values.astype(np.float64)
+
+        # The transpose of a data frame's single block is already C ordered, so this only copies when necessary
+        return cls(names, np.ascontiguousarray(values.T))
+
+    def getNames(self):
+        return self._names
+
+    def getMatrix(self):
+        return self._matrix
+
+    def getRange(self, percentiles=None):
+        """
+        Returns (minimum, maximum) over every channel, or the (lower, upper) percentiles if given, so a few artifact
+        spikes do not set the range. NaN values, times a merged package does not cover, are left out. Ranges are
+        cached as the values of a ChannelData never change.
+        """
+        key = None if percentiles is None else tuple(percentiles)
+        if key not in self._ranges:
+            if key is None:
+                self._ranges[key] = (float(np.nanmin(self._matrix)), float(np.nanmax(self._matrix)))
+            elif self._matrix.size <= self._exact_percentile_limit:
+                lower, upper = np.nanpercentile(self._matrix, key)
+                self._ranges[key] = (float(lower), float(upper))
+            else:
+                sketch = QuantileSketch()
+                for row in self._matrix:
+                    sketch.update(row[~np.isnan(row)])
+                lower, upper = sketch.quantile(np.asarray(key) / 100.0)
+                self._ranges[key] = (float(lower), float(upper))
+        return self._ranges[key]
+
+    def indexOf(self, name):
+        return self._indices[name]
+
+    def keys(self):
+        return list(self._names)
+
+    def values(self):
+        return [self._matrix[index] for index in range(len(self._names))]
+
+    def items(self):
+        return [(name, self._matrix[index]) for index, name in enumerate(self._names)]
+
+    def __getitem__(self, name):
+        return self._matrix[self._indices[name]]
+
+    def __contains__(self, name):
+        return name in self._indices
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
@@ -0,0 +1,80 @@
+# chunkbuffer.py
+# --------------
+# ChunkBuffer collects the data frames of a download that is fetched in fixed windows into one preallocated
+# (samples x channels) array, so long recordings are not concatenated again for every chunk that arrives. Only the
+# channel columns are buffered, time columns such as the timestamps of Tabular packages are left out as
+# _create_file_cache leaves them out of the channel data.
+
+import numpy as np
+import pandas as pd
+
+
+class ChunkBuffer(object):
+
+    def __init__(self, number_of_chunks, drop_overlap=True):
+        self._number_of_chunks = number_of_chunks
+        self._drop_overlap = drop_overlap
+        self._columns = None
+        self._values = None
+        self._index = None
+        self._timezone = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _allocate(self, chunk):
+        # Size the buffer from the first chunk, later chunks of a fixed window are expected to be the same length
+        capacity = max(len(chunk), 1) * self._number_of_chunks
+        self._columns = [key for key in chunk.columns if 'time' not in key]
+        self._values = np.empty((capacity, len(self._columns)), dtype=np.float64)
+        if isinstance(chunk.index, pd.DatetimeIndex):
+            self._timezone = chunk.index.tz
+            self._index = np.empty(capacity, dtype='datetime64[ns]')
+        else:
+            self._index = np.empty(capacity, dtype=chunk.index.dtype)
+
+    def _grow(self, required_size):
+        capacity = max(required_size, 2 * len(self._values))
+        values = np.empty((capacity, self._values.shape[1]), dtype=self._values.dtype)
+        values[:self._size] = self._values[:self._size]
+        index = np.empty(capacity, dtype=self._index.dtype)
+        index[:self._size] = self._index[:self._size]
+        self._values = values
+        self._index = index
+
+    def append(self, chunk):
+        if self._values is None:
+            self._allocate(chunk)
+
+        index = chunk.index
+        if isinstance(index, pd.DatetimeIndex):
+            index = index.tz_convert('UTC').tz_localize(None) if index.tz is not None else index
+        index = np.asarray(index.values, dtype=self._index.dtype)
+        values = chunk[self._columns].values
+
+        # Windows may share their boundary sample, only keep samples after the last one stored
+        if self._drop_overlap and self._size > 0:
+            first_new = np.searchsorted(index, self._index[self._size - 1], side='right')
+            index = index[first_new:]
+            values = values[first_new:]
+
+        end = self._size + len(index)
+        if end > len(self._values):
+            self._grow(end)
+        self._values[self._size:end] = values
+        self._index[self._size:end] = index
+        self._size = end
+
+    def toDataFrame(self):
+        if self._values is None:
+            return pd.DataFrame()
+
+        if np.issubdtype(self._index.dtype, np.datetime64):
+            index = pd.DatetimeIndex(self._index[:self._size])
+            if self._timezone is not None:
+                index = index.tz_localize('UTC').tz_convert(self._timezone)
+        else:
+            index = pd.Index(self._index[:self._size])
+
+        return pd.DataFrame(self._values[:self._size], index=index, columns=self._columns)
@@ -0,0 +1,43 @@
+# clientpool.py
+# -------------
+# ClientPool keeps one authenticated Blackfynn client per profile so repeated dataset listings and data fetches
+# reuse the client's HTTP session instead of logging in again. Clients are recreated once they are older than
+# the time to live, or when the profile's API key changes.
+
+import time
+import threading
+
+
+class ClientPool(object):
+
+    def __init__(self, client_factory, time_to_live=1800, clock=time.time):
+        # client_factory is called as client_factory(api_token=..., api_secret=...), normally the Blackfynn class
+        self._client_factory = client_factory
+        self._time_to_live = time_to_live
+        self._clock = clock
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def setTimeToLive(self, time_to_live):
+        self._time_to_live = time_to_live
+
+    def getClient(self, profile_name, api_token, api_secret):
+        with self._lock:
+            now = self._clock()
+            entry = self._clients.get(profile_name)
+            if entry is not None:
+                client, credentials, created = entry
+                if credentials == (api_token, api_secret) and now - created < self._time_to_live:
+                    return client
+
+            client = self._client_factory(api_token=api_token, api_secret=api_secret)
+            self._clients[profile_name] = (client, (api_token, api_secret), now)
+            return client
+
+    def invalidate(self, profile_name=None):
+        # invalidate: Drops the client for a profile (or all clients) so the next request authenticates again
+        with self._lock:
+            if profile_name is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(profile_name, None)
@@ -0,0 +1,42 @@
+# downloadthread.py
+# -----------------
+# DownloadThread runs a Blackfynn download off the Qt UI thread. The download is a callable taking
+# (progress_callback, is_cancelled) so the same thread serves any of the data model's streaming fetches.
+
+from PySide import QtCore
+
+from mapclientplugins.ecgstep.model.blackfynndatamodel import DownloadCancelled
+
+
+class DownloadThread(QtCore.QThread):
+
+    progressChanged = QtCore.Signal(int, int)
+    downloadFinished = QtCore.Signal(object)
+    downloadFailed = QtCore.Signal(str)
+    downloadCancelled = QtCore.Signal()
+
+    def __init__(self, download, parent=None):
+        super(DownloadThread, self).__init__(parent)
+        self._download = download
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def _progress(self, done, total):
+        self.progressChanged.emit(done, total)
+
+    def run(self):
+        try:
+            result = self._download(self._progress, self.isCancelled)
+        except DownloadCancelled:
+            self.downloadCancelled.emit()
+            return
+        except Exception as e:
+            self.downloadFailed.emit(str(e))
+            return
+
+        self.downloadFinished.emit(result)
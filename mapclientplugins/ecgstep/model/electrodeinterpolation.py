@@ -0,0 +1,82 @@
+# electrodeinterpolation.py
+# -------------------------
+# ElectrodeInterpolation colours mesh nodes from electrodes at known positions by inverse distance weighting of
+# each node's nearest electrodes. The weights are computed once into a sparse (nodes x electrodes) matrix, stored as
+# the k neighbours and weights of every node, so interpolating every time step is a single sparse product however
+# the electrodes are laid out. scipy's KD-tree is used to find neighbours when it is installed.
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def _nearestNeighbours(points, queries, number_of_neighbours, block_size=4096):
+    # Brute force k nearest neighbours, in blocks of queries to keep the distance matrix small
+    distances = np.empty((len(queries), number_of_neighbours))
+    indices = np.empty((len(queries), number_of_neighbours), dtype=np.intp)
+    for first in range(0, len(queries), block_size):
+        block = queries[first:first + block_size]
+        squared = ((block[:, np.newaxis, :] - points[np.newaxis, :, :]) ** 2).sum(axis=2)
+        nearest = np.argpartition(squared, number_of_neighbours - 1, axis=1)[:, :number_of_neighbours]
+        nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+        order = np.argsort(nearest_squared, axis=1)
+        indices[first:first + len(block)] = np.take_along_axis(nearest, order, axis=1)
+        distances[first:first + len(block)] = np.sqrt(np.take_along_axis(nearest_squared, order, axis=1))
+    return distances, indices
+
+
+class ElectrodeInterpolation(object):
+
+    def __init__(self, node_positions, electrode_positions, electrode_rows=None, number_of_neighbours=4, power=2.0):
+        """
+        node_positions is (nodes x dimensions) and electrode_positions (electrodes x dimensions) in the same frame.
+        electrode_rows gives the row of the data matrix holding each electrode's channel, by default electrode i
+        is row i.
+        """
+        node_positions = np.asarray(node_positions, dtype=np.float64)
+        electrode_positions = np.asarray(electrode_positions, dtype=np.float64)
+        if len(electrode_positions) == 0:
+            raise ValueError('At least one electrode position is needed for interpolation')
+        if electrode_rows is None:
+            electrode_rows = np.arange(len(electrode_positions))
+        number_of_neighbours = min(number_of_neighbours, len(electrode_positions))
+
+        if cKDTree is not None:
+            distances, indices = cKDTree(electrode_positions).query(node_positions, k=number_of_neighbours)
+            distances = distances.reshape(len(node_positions), number_of_neighbours)
+            indices = indices.reshape(len(node_positions), number_of_neighbours)
+        else:
+            distances, indices = _nearestNeighbours(electrode_positions, node_positions, number_of_neighbours)
+
+        # A node on top of an electrode takes that electrode's value alone
+        coincident = distances[:, 0] <= 1e-12
+        weights = 1.0 / np.maximum(distances, 1e-12) ** power
+        weights[coincident] = 0.0
+        weights[coincident, 0] = 1.0
+        weights /= weights.sum(axis=1)[:, np.newaxis]
+
+        self._rows = np.asarray(electrode_rows, dtype=np.intp)[indices]
+        self._weights = weights
+
+    def getNumberOfNodes(self):
+        return len(self._weights)
+
+    def getWeights(self):
+        # getWeights: Returns the sparse weight matrix as (node indices, data rows, weights) triplets
+        node_indices = np.repeat(np.arange(len(self._weights)), self._weights.shape[1])
+        return node_indices, self._rows.ravel(), self._weights.ravel()
+
+    def getNearestRow(self, node_index):
+        # getNearestRow: Returns the data row with the greatest weight at a node
+        return int(self._rows[node_index, np.argmax(self._weights[node_index])])
+
+    def interpolate(self, matrix):
+        """ Returns the (nodes x times) node values for a (channels x times) data matrix. """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        result = np.zeros((len(self._weights), matrix.shape[1]))
+        for neighbour in range(self._weights.shape[1]):
+            result += self._weights[:, neighbour, np.newaxis] * matrix[self._rows[:, neighbour]]
+        return result
@@ -0,0 +1,123 @@
+# electrodemeshes.py
+# ------------------
+# ElectrodeMeshes keeps several named electrode meshes, an epicardial sock and plaque arrays say, in the one
+# ecg_plane region. The meshes share the coordinates and colour fields, the node and element templates, the spectrum
+# and the zinc time sequences, while each has its own group, graphics and block of node identifiers, so adding or
+# rebuilding one mesh leaves the others as they are.
+
+from collections import OrderedDict
+
+from mapclientplugins.ecgstep.model.blackfynnmesh import BlackfynnMesh
+
+
+class ElectrodeMeshes(object):
+
+    def __init__(self, region, identifiers_per_mesh=1000000):
+        # Each mesh numbers its nodes and elements from the start of its own block of identifiers_per_mesh
+        self._region = region
+        self._identifiers_per_mesh = identifiers_per_mesh
+        self._meshes = OrderedDict()
+        self._data = []
+        self._data_time_sequence = []
+        self._electrode_positions = None
+        self._electrode_rows = None
+
+    def getMeshNames(self):
+        return list(self._meshes)
+
+    def getMesh(self, name):
+        return self._meshes[name]
+
+    def hasMesh(self, name):
+        return name in self._meshes
+
+    def _getGeneratedMeshes(self):
+        return [mesh for mesh in self._meshes.values() if mesh.is_generated()]
+
+    def addMesh(self, name, time_based_node_description):
+        """
+        Adds a mesh for a scaffold description, given the current data and electrode positions. It is built by the
+        next generateMeshes.
+        """
+        if name in self._meshes:
+            raise ValueError('There is already an electrode mesh named {0}'.format(name))
+        first_node_identifier = len(self._meshes) * self._identifiers_per_mesh
+        mesh = BlackfynnMesh(self._region, time_based_node_description, name=name,
+                             first_node_identifier=first_node_identifier)
+        mesh.set_data_time_sequence(self._data_time_sequence)
+        mesh.set_data(self._data)
+        mesh.set_electrode_positions(self._electrode_positions, self._electrode_rows)
+        self._meshes[name] = mesh
+        return mesh
+
+    def setData(self, data, data_time_sequence):
+        # setData: Sets the data of meshes that are still to be generated, see updateData for generated meshes
+        self._data = data
+        self._data_time_sequence = data_time_sequence
+        for mesh in self._meshes.values():
+            if not mesh.is_generated():
+                mesh.set_data_time_sequence(data_time_sequence)
+                mesh.set_data(data)
+
+    def setElectrodePositions(self, electrode_positions, electrode_rows=None):
+        self._electrode_positions = electrode_positions
+        self._electrode_rows = electrode_rows
+        for mesh in self._meshes.values():
+            mesh.set_electrode_positions(electrode_positions, electrode_rows)
+
+    def generateMeshes(self):
+        """
+        Builds and draws every mesh not generated yet in one change to the region and its scene, so the graphics
+        are only rebuilt once for the batch. Later meshes reuse the templates of the first, and meshes that are
+        already generated are left as they are.
+        """
+        new_meshes = [mesh for mesh in self._meshes.values() if not mesh.is_generated()]
+        if not new_meshes:
+            return
+        generated_meshes = self._getGeneratedMeshes()
+        region = new_meshes[0].get_region()
+        field_module = region.getFieldmodule()
+        scene = region.getScene()
+        scene.beginChange()
+        field_module.beginChange()
+        for mesh in new_meshes:
+            if generated_meshes:
+                mesh.share_definitions(generated_meshes[0])
+            mesh.generate_mesh()
+            mesh.drawMesh()
+            generated_meshes.append(mesh)
+        field_module.endChange()
+        scene.endChange()
+
+    def updateData(self, data, data_time_sequence=None):
+        # updateData: Rewrites the colours of every generated mesh in one change to the region
+        self._data = data
+        if data_time_sequence is not None:
+            self._data_time_sequence = data_time_sequence
+        generated_meshes = self._getGeneratedMeshes()
+        if not generated_meshes:
+            return
+        field_module = generated_meshes[0].get_region().getFieldmodule()
+        field_module.beginChange()
+        for mesh in generated_meshes:
+            mesh.update_data(data, data_time_sequence)
+        field_module.endChange()
+
+    def setVisibility(self, name, state):
+        self._meshes[name].set_visibility(state)
+
+    def isVisible(self, name):
+        return self._meshes[name].is_visible()
+
+    def setSpectrumRange(self, minimum, maximum):
+        # The meshes share one spectrum, so setting it through any of them sets it for all
+        generated_meshes = self._getGeneratedMeshes()
+        if generated_meshes:
+            generated_meshes[0].set_spectrum_range(minimum, maximum)
+
+    def getChannelIndexForNode(self, node_identifier):
+        # getChannelIndexForNode: Returns the data row colouring a node of any of the meshes, or None
+        for mesh in self._meshes.values():
+            if mesh.has_node(node_identifier):
+                return mesh.get_channel_index_for_node(node_identifier)
+        return None
@@ -0,0 +1,200 @@
+# fakeblackfynn.py
+# ----------------
+# FakeBlackfynn is an in-process stand-in for the blackfynn-python client. It serves synthetic multi-channel ECG
+# recordings through the same calls the data model makes (datasets, get_dataset, package get_data, upload) so the
+# ingest path can be benchmarked and regression tested without an account or network access.
+#
+# Example:
+#     backend = FakeBlackfynn(latency=0.05)
+#     backend.addSyntheticDataset('Sock array', number_of_channels=256, sample_rate=2000, duration=1800)
+#     model = BlackfynnDataModel(client_factory=backend.connect)
+
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def generateSyntheticEcg(number_of_channels, sample_rate, first_sample, number_of_samples, heart_rate=72.0,
+                         noise=0.02, seed=0):
+    """
+    Returns a (samples x channels) array of synthetic ECG. Each beat is a sum of Gaussian P, QRS and T waves and
+    every channel sees the beat slightly later and at a different amplitude, as if activation spread across the
+    electrode array. Samples are a function of their absolute sample number so any window of a recording can be
+    generated on its own and agrees with a longer window covering it, apart from the noise.
+    """
+    times = (first_sample + np.arange(number_of_samples, dtype=np.float64)) / sample_rate
+    channels = np.arange(number_of_channels, dtype=np.float64)
+    beat_period = 60.0 / heart_rate
+    delays = 0.04 * channels / max(number_of_channels - 1, 1)
+    amplitudes = 0.5 + 0.5 * np.cos(channels * 0.7) ** 2
+
+    # Phase within the current beat for every (sample, channel) pair
+    phase = np.mod(times[:, np.newaxis] - delays[np.newaxis, :], beat_period)
+    waves = ((0.15, 0.16, 0.025), (-0.15, 0.28, 0.008), (1.0, 0.30, 0.010), (-0.25, 0.32, 0.008), (0.3, 0.55, 0.04))
+    signal = np.zeros((number_of_samples, number_of_channels))
+    for amplitude, centre, width in waves:
+        signal += amplitude * np.exp(-0.5 * ((phase - centre) / width) ** 2)
+    signal *= amplitudes[np.newaxis, :]
+
+    if noise:
+        random_state = np.random.RandomState((seed * 1000003 + first_sample) % (2 ** 32))
+        signal += noise * random_state.standard_normal(signal.shape)
+
+    return signal
+
+
+class FakeBlackfynn(object):
+
+    def __init__(self, api_token=None, api_secret=None, latency=0.0, samples_per_second_transfer=None):
+        # latency is slept on every call, samples_per_second_transfer (if given) adds time in proportion to the
+        # number of samples returned by get_data to mimic a limited bandwidth
+        self._datasets = []
+        self._latency = latency
+        self._samples_per_second_transfer = samples_per_second_transfer
+        self.connections = 0
+
+    def connect(self, api_token=None, api_secret=None):
+        # connect: Use as BlackfynnDataModel's client_factory, counts how often the model authenticates
+        self.connections += 1
+        return self
+
+    def setLatency(self, latency):
+        self._latency = latency
+
+    def _wait(self, number_of_samples=0):
+        delay = self._latency
+        if self._samples_per_second_transfer:
+            delay += number_of_samples / float(self._samples_per_second_transfer)
+        if delay > 0:
+            time.sleep(delay)
+
+    def addSyntheticDataset(self, dataset_name, number_of_channels=8, sample_rate=1000, duration=60.0,
+                            number_of_packages=1, package_type='TimeSeries'):
+        dataset = FakeDataset(self, dataset_name)
+        for package_index in range(number_of_packages):
+            dataset.addPackage(FakePackage(self, '{0} {1}'.format(package_type, package_index + 1), package_type,
+                                           number_of_channels, sample_rate, duration, seed=package_index))
+        self._datasets.append(dataset)
+        return dataset
+
+    def datasets(self):
+        self._wait()
+        return list(self._datasets)
+
+    def get_dataset(self, name):
+        self._wait()
+        for dataset in self._datasets:
+            if dataset.name == name or dataset.id == name:
+                return dataset
+        raise Exception('No dataset matching name or ID \'{0}\'.'.format(name))
+
+    def create_dataset(self, name):
+        self._wait()
+        dataset = FakeDataset(self, name)
+        self._datasets.append(dataset)
+        return dataset
+
+
+class FakeDataset(object):
+
+    def __init__(self, backend, name):
+        self._backend = backend
+        self.name = name
+        self.id = 'N:dataset:{0}'.format(uuid.uuid4())
+        self.items = []
+        self.uploads = []
+
+    def addPackage(self, package):
+        self.items.append(package)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def upload(self, *files):
+        size = sum(os.path.getsize(filename) for filename in files)
+        self._backend._wait()
+        self.uploads.extend(files)
+        return size
+
+
+class FakeChannel(object):
+
+    def __init__(self, name, rate):
+        self.id = 'N:channel:{0}'.format(uuid.uuid4())
+        self.name = name
+        self.rate = rate
+
+
+class FakePackage(object):
+    """
+    A TimeSeries or Tabular package. TimeSeries data is indexed by time and selected with start/end/length in
+    microseconds (length may also be a string such as '10s') and a list of channels, Tabular data has a 'time'
+    column and is selected with limit/offset rows.
+    """
+
+    def __init__(self, backend, name, package_type, number_of_channels, sample_rate, duration, seed=0):
+        self._backend = backend
+        self.name = name
+        self.type = package_type
+        self.id = 'N:package:{0}'.format(uuid.uuid4())
+        self.sample_rate = sample_rate
+        self.number_of_samples = int(duration * sample_rate)
+        self.channels = [FakeChannel('ch{0}'.format(index + 1), sample_rate) for index in range(number_of_channels)]
+        self.start = 1500000000 * 1000000
+        self.end = self.start + int(duration * 1e6)
+        self.updated_at = '2019-01-01T00:00:00Z'
+        self._seed = seed
+
+    def touch(self):
+        # touch: Marks the package as modified, as editing it on the platform would
+        self.updated_at = pd.Timestamp.now('UTC').isoformat()
+
+    def _samples(self, first_sample, number_of_samples, channel_indexes=None):
+        first_sample = max(0, min(first_sample, self.number_of_samples))
+        number_of_samples = max(0, min(number_of_samples, self.number_of_samples - first_sample))
+        values = generateSyntheticEcg(len(self.channels), self.sample_rate, first_sample, number_of_samples,
+                                      seed=self._seed)
+        if channel_indexes is not None:
+            values = values[:, channel_indexes]
+        sample_nanoseconds = np.round((first_sample + np.arange(number_of_samples)) * 1e9 / self.sample_rate)
+        times = pd.to_datetime(self.start * 1000 + sample_nanoseconds.astype(np.int64))
+        self._backend._wait(number_of_samples * values.shape[1])
+        return first_sample, times, values
+
+    def _microsecondsToSample(self, usecs):
+        return int(np.ceil((usecs - self.start) * self.sample_rate / 1e6))
+
+    def get_data(self, start=None, end=None, length=None, limit=None, offset=0, channels=None):
+        # channels selects TimeSeries channels by channel or channel id, only those are transferred
+        names = [channel.name for channel in self.channels]
+        if self.type == 'Tabular':
+            limit = 1000 if limit is None else limit
+            first_sample, times, values = self._samples(offset, limit)
+            data_frame = pd.DataFrame(values, columns=names,
+                                      index=pd.RangeIndex(first_sample, first_sample + len(values)))
+            data_frame.insert(0, 'time', times)
+            return data_frame
+
+        start = self.start if start is None else start
+        if end is None:
+            if length is None:
+                end = self.end
+            elif isinstance(length, str):
+                end = start + int(pd.Timedelta(length).total_seconds() * 1e6)
+            else:
+                end = start + int(length)
+        channel_indexes = None
+        if channels is not None:
+            channel_ids = [getattr(channel, 'id', channel) for channel in channels]
+            channel_indexes = [index for index, channel in enumerate(self.channels) if channel.id in channel_ids]
+            names = [names[index] for index in channel_indexes]
+        first_sample = self._microsecondsToSample(start)
+        last_sample = self._microsecondsToSample(end)
+        first_sample, times, values = self._samples(first_sample, last_sample - first_sample, channel_indexes)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(times), columns=names)
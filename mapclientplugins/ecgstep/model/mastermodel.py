@@ -24,6 +24,7 @@ class MasterModel(object):
         self._initialise()
         self._region = self._context.createRegion()
         self._blackfynn_data_model = BlackfynnDataModel()
+        self._blackfynn_data_model.setCacheDirectory(self._filenameStem + '-timeseries-cache')
         self._video_path = video_path
         self.video = Video(video_path, 30)
         self._settings = {
@@ -1,11 +1,28 @@
 import json
+import numpy as np
 import pyqtgraph as pg
 
+from PySide import QtCore
+
+from mapclientplugins.ecgstep.model.plotpyramid import PlotPyramid
+
 class Plot:
-    def __init__(self, data):
+    def __init__(self, data, stacked=False):
         self.line = None
         self.datalen = 1
         self.data = data
+        self.stacked = stacked
+        self.curves = {}
+        self.pyramids = {}
+        self.channel_offsets = {}
+        self._channel_spacing = 0.0
+        self.highlighted_channel = None
+        self.time_offset = 0
+        # Nudging only moves the curves, the data at the edges of the view is refilled once nudging pauses
+        self._refill_timer = QtCore.QTimer()
+        self._refill_timer.setSingleShot(True)
+        self._refill_timer.setInterval(100)
+        self._refill_timer.timeout.connect(self._updateCurves)
         self.plotData(data)
 
     def plotJson(self, filename):
@@ -21,29 +38,107 @@ class Plot:
         self.datalen = max(data['times'])
 
     def plotData(self, data):
+        # The times are copied once so the pyramids are always built from the times as downloaded, whatever
+        # nudgeDataStart has done to the data handed out since
         self.original_data = data
         self.data = data
+        self._original_times = np.array(data['times'], dtype=np.float64)
+        self.pyramids = {}
+        self.highlighted_channel = next(iter(data['cache']))
 
-        self.pw = pg.plot(data['times'],
-                          data['cache'][next(iter(data['cache']))],
-                          pen='b')
+        # Only the points visible at screen resolution are drawn, taken from a min/max pyramid of each channel.
+        # All channels share the one time cursor line.
+        self.pw = pg.plot()
         self.line = self.pw.addLine(x=0, pen='r')
-        self.datalen = max(data['times'])
+        start_time, end_time = self._getPyramid(self.highlighted_channel).getTimeRange()
+        self.datalen = end_time
+        self._createCurves()
+        self.pw.setXRange(start_time, end_time, padding=0)
+        self.pw.getViewBox().sigRangeChanged.connect(self._viewRangeChanged)
+
+    def _getPyramid(self, channel_name):
+        # Pyramids are built the first time a channel is shown
+        if channel_name not in self.pyramids:
+            self.pyramids[channel_name] = PlotPyramid(self._original_times, self.data['cache'][channel_name])
+        return self.pyramids[channel_name]
+
+    def _createCurves(self):
+        for curve in self.curves.values():
+            self.pw.removeItem(curve)
+        self.curves = {}
+        self.channel_offsets = {}
+
+        if self.stacked:
+            channel_names = list(self.data['cache'])
+            # Space the channels by the typical channel range so traces do not overlap
+            ranges = [np.ptp(self._getPyramid(name).getLevelValues()) for name in channel_names]
+            spacing = 1.2 * np.median(ranges) if ranges else 1.0
+        else:
+            channel_names = [self.highlighted_channel]
+            spacing = 0.0
+
+        for index, channel_name in enumerate(channel_names):
+            self.channel_offsets[channel_name] = -index * spacing
+            curve = self.pw.plot(pen=self._channelPen(channel_name))
+            # Time and channel offsets are applied as a transform so changing them never touches the data
+            curve.setPos(self.time_offset, self.channel_offsets[channel_name])
+            self.curves[channel_name] = curve
+        self._channel_spacing = spacing
+        if self.stacked:
+            self.pw.setYRange(-(len(channel_names) - 0.5) * spacing, 0.5 * spacing, padding=0)
+        self._updateCurves()
+
+    def _channelPen(self, channel_name):
+        if self.stacked and channel_name == self.highlighted_channel:
+            return pg.mkPen('m', width=2)
+        return pg.mkPen('b')
+
+    def setStacked(self, stacked):
+        # setStacked: Switches between the highlighted channel alone and every channel stacked vertically
+        if stacked != self.stacked:
+            self.stacked = stacked
+            self._createCurves()
+
+    def highlightChannel(self, channel_name):
+        # highlightChannel: Emphasises a channel in the stacked view, or shows it in place of the current channel
+        if channel_name not in self.data['cache'] or channel_name == self.highlighted_channel:
+            return
+
+        previous_channel = self.highlighted_channel
+        self.highlighted_channel = channel_name
+        if self.stacked:
+            self.curves[previous_channel].setPen(self._channelPen(previous_channel))
+            self.curves[channel_name].setPen(self._channelPen(channel_name))
+        else:
+            self._createCurves()
+
+    def _viewRangeChanged(self, view_box, view_range):
+        self._updateCurves()
+
+    def _updateCurves(self):
+        (start_time, end_time), (bottom, top) = self.pw.getViewBox().viewRange()
+        maximum_points = max(2 * int(self.pw.getViewBox().width()), 1000)
+        half_band = self._channel_spacing / 2
+        for channel_name, curve in self.curves.items():
+            offset = self.channel_offsets[channel_name]
+            if self.stacked and (offset + half_band < bottom or offset - half_band > top):
+                # Channels scrolled out of view are not drawn at all
+                curve.setVisible(False)
+                continue
+            times, values = self._getPyramid(channel_name).getData(start_time - self.time_offset,
+                                                                   end_time - self.time_offset, maximum_points)
+            curve.setData(times, values)
+            curve.setVisible(True)
 
     def nudgePlotStart(self, value):
-        newTimes = []
-        for i,val in enumerate(self.original_data['times']):
-            newTimes.append(val+value)
-
-        self.pw.clear()
-        self.pw.plot(newTimes,
-                          self.data['cache'][next(iter(self.data['cache']))],
-                          pen='b')
-        self.line = self.pw.addLine(x=0, pen='r')
+        self.time_offset = value
+        for channel_name, curve in self.curves.items():
+            curve.setPos(value, self.channel_offsets[channel_name])
+        self._refill_timer.start()
 
     def nudgeDataStart(self, value):
-        newTimes = []
-        for i,val in enumerate(self.original_data['times']):
-            newTimes.append(val+value)
-        self.data['times'] = newTimes
-        return self.data
\ No newline at end of file
+        # nudgeDataStart: Returns a new data dictionary with the times shifted by value, the dictionary the plot was
+        #                 given is left as it is
+        self.data = dict(self.data)
+        self.data['times'] = self._original_times + value
+        return self.data
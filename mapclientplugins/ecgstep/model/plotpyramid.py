@@ -0,0 +1,66 @@
+# plotpyramid.py
+# --------------
+# PlotPyramid precomputes min/max decimations of a channel at a series of resolutions so a plot only has to draw
+# about as many points as there are pixels, whatever the zoom level. Level 0 is the raw channel and each level above
+# keeps the minimum and maximum of `factor` blocks of the level below it, so peaks are never lost.
+
+import numpy as np
+
+
+class PlotPyramid(object):
+
+    def __init__(self, times, values, factor=4, minimum_points=512):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        self._factor = factor
+        # Each level is (block start times, block minimums, block maximums), level 0 blocks are single samples
+        self._levels = [(times, values, values)]
+        while len(self._levels[-1][0]) > minimum_points:
+            block_times, minimums, maximums = self._levels[-1]
+            number_of_blocks = len(block_times) // factor
+            if number_of_blocks == 0:
+                break
+            end = number_of_blocks * factor
+            next_times = block_times[:end:factor]
+            next_minimums = minimums[:end].reshape(number_of_blocks, factor).min(axis=1)
+            next_maximums = maximums[:end].reshape(number_of_blocks, factor).max(axis=1)
+            if end < len(block_times):
+                # Keep the partial block at the end of the channel
+                next_times = np.append(next_times, block_times[end])
+                next_minimums = np.append(next_minimums, minimums[end:].min())
+                next_maximums = np.append(next_maximums, maximums[end:].max())
+            self._levels.append((next_times, next_minimums, next_maximums))
+
+    def getNumberOfLevels(self):
+        return len(self._levels)
+
+    def getLevelValues(self, level=-1):
+        # getLevelValues: Returns the minimums and maximums of a level, the coarsest by default
+        block_times, minimums, maximums = self._levels[level]
+        return np.concatenate((minimums, maximums))
+
+    def getTimeRange(self):
+        times = self._levels[0][0]
+        return times[0], times[-1]
+
+    def getData(self, start_time, end_time, maximum_points):
+        """
+        Returns (times, values) covering [start_time, end_time] at the finest level that needs no more than
+        maximum_points points. One block either side of the range is included so lines run off the plot edges.
+        """
+        for level, (block_times, minimums, maximums) in enumerate(self._levels):
+            first = max(np.searchsorted(block_times, start_time, side='right') - 2, 0)
+            last = min(np.searchsorted(block_times, end_time, side='left') + 2, len(block_times))
+            points = (last - first) * (1 if level == 0 else 2)
+            if points <= maximum_points or level == len(self._levels) - 1:
+                break
+
+        if level == 0:
+            return block_times[first:last], minimums[first:last]
+
+        # Draw each block as a vertical stroke from its minimum to its maximum
+        times = np.repeat(block_times[first:last], 2)
+        values = np.empty(len(times))
+        values[0::2] = minimums[first:last]
+        values[1::2] = maximums[first:last]
+        return times, values
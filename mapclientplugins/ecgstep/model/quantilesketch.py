@@ -0,0 +1,78 @@
+# quantilesketch.py
+# -----------------
+# QuantileSketch estimates quantiles of a stream of values in bounded memory, for data too large to sort at once.
+# It is a KLL style sketch: values are kept in levels of at most `capacity` items, and a full level is sorted and
+# every other item promoted to the next level, where each item stands for twice as many values. Sketches of
+# separate parts of a recording can be merged.
+
+import numpy as np
+
+
+class QuantileSketch(object):
+
+    def __init__(self, capacity=4096, seed=0):
+        self._capacity = capacity
+        self._levels = [np.empty(0)]
+        self._random_state = np.random.RandomState(seed)
+        self._minimum = np.inf
+        self._maximum = -np.inf
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        self._minimum = min(self._minimum, values.min())
+        self._maximum = max(self._maximum, values.max())
+        self._count += values.size
+        self._levels[0] = np.concatenate((self._levels[0], values))
+        self._compress()
+
+    def merge(self, other):
+        # merge: Adds the values summarised by another sketch to this one
+        if other._count == 0:
+            return
+        self._minimum = min(self._minimum, other._minimum)
+        self._maximum = max(self._maximum, other._maximum)
+        self._count += other._count
+        for level, items in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[level] = np.concatenate((self._levels[level], items))
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity:
+                items = np.sort(items)
+                # An odd item out stays at this level so no weight is lost
+                kept = items[len(items) - len(items) % 2:]
+                promoted = items[self._random_state.randint(2):len(items) - len(items) % 2:2]
+                self._levels[level] = kept
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                self._levels[level + 1] = np.concatenate((self._levels[level + 1], promoted))
+            level += 1
+
+    def quantile(self, q):
+        """
+        Returns the estimated value at quantile q (0 to 1, or an array of them). The minimum and maximum are exact.
+        """
+        if self._count == 0:
+            raise ValueError('Quantile of an empty sketch')
+        q = np.asarray(q, dtype=np.float64)
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(items_at_level), 2.0 ** level)
+                                  for level, items_at_level in enumerate(self._levels)])
+        order = np.argsort(items)
+        items = items[order]
+        cumulative_weights = np.cumsum(weights[order])
+        indices = np.searchsorted(cumulative_weights, q * cumulative_weights[-1], side='left')
+        result = items[np.minimum(indices, len(items) - 1)]
+        result = np.where(q <= 0, self._minimum, np.where(q >= 1, self._maximum, result))
+        return result if result.ndim else float(result)
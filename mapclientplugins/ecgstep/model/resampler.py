@@ -0,0 +1,189 @@
+# resampler.py
+# ------------
+# Resampler maps a (channels x samples) channel matrix recorded at `times` onto a new set of target times, such as
+# the time sequence of the electrode mesh. Every mode works on all channels in one call. Further modes can be
+# registered with Resampler.addMode.
+
+import numpy as np
+
+
+def _nearestIndices(times, target_times):
+    indices = np.clip(np.searchsorted(times, target_times), 1, len(times) - 1)
+    previous_is_closer = (target_times - times[indices - 1]) <= (times[indices] - target_times)
+    return indices - previous_is_closer
+
+
+def _binEdges(times, target_times):
+    # Each target time owns the samples closer to it than to its neighbouring target times
+    if len(target_times) > 1:
+        midpoints = (target_times[1:] + target_times[:-1]) / 2
+        lower = 2 * target_times[0] - midpoints[0]
+        upper = 2 * target_times[-1] - midpoints[-1]
+    else:
+        midpoints = np.empty(0)
+        lower = upper = target_times[0]
+    return np.searchsorted(times, np.concatenate(([lower], midpoints, [upper])))
+
+
+def _reduceBins(matrix, times, target_times, reduce_function):
+    # reduce_function is a numpy ufunc whose reduceat is applied to the samples of each bin, bins without samples
+    # take the nearest sample instead
+    edges = _binEdges(times, target_times)
+    starts = edges[:-1]
+    empty = edges[1:] <= starts
+    result = np.empty((matrix.shape[0], len(target_times)))
+    if not np.all(empty):
+        window = matrix[:, edges[0]:edges[-1]]
+        reduced = reduce_function.reduceat(window, np.minimum(starts, edges[-1] - 1) - edges[0], axis=1)
+        result[:, ~empty] = reduced[:, ~empty]
+    if np.any(empty):
+        result[:, empty] = matrix[:, _nearestIndices(times, target_times[empty])]
+    return result, edges
+
+
+def resampleNearest(matrix, times, target_times):
+    """ Picks the sample nearest each target time. """
+    return matrix[:, _nearestIndices(times, target_times)]
+
+
+def resampleLinear(matrix, times, target_times):
+    """ Linearly interpolates every channel at exactly the target times. """
+    indices = np.clip(np.searchsorted(times, target_times), 1, len(times) - 1)
+    previous_times = times[indices - 1]
+    spacing = times[indices] - previous_times
+    weights = np.clip((target_times - previous_times) / np.where(spacing > 0, spacing, 1), 0, 1)
+    return matrix[:, indices - 1] * (1 - weights) + matrix[:, indices] * weights
+
+
+def resampleMean(matrix, times, target_times):
+    """ Averages the samples falling in each target time's bin. """
+    sums, edges = _reduceBins(matrix, times, target_times, np.add)
+    counts = np.diff(edges)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), sums)
+
+
+def resampleEnvelope(matrix, times, target_times):
+    """
+    Returns a (minimum, maximum) pair of matrices holding the range of the samples in each target time's bin.
+    """
+    minimum, _ = _reduceBins(matrix, times, target_times, np.minimum)
+    maximum, _ = _reduceBins(matrix, times, target_times, np.maximum)
+    return minimum, maximum
+
+
+def resampleMinMax(matrix, times, target_times):
+    """ Keeps whichever end of each bin's min/max envelope lies furthest from the bin mean, so peaks survive. """
+    minimum, maximum = resampleEnvelope(matrix, times, target_times)
+    mean = resampleMean(matrix, times, target_times)
+    return np.where(maximum - mean >= mean - minimum, maximum, minimum)
+
+
+def _firDecimate(matrix, factor):
+    # Windowed sinc low pass at the decimated Nyquist frequency, evaluated only at the samples that are kept
+    number_of_taps = 4 * factor + 1
+    offsets = np.arange(number_of_taps) - number_of_taps // 2
+    taps = np.sinc(offsets / float(factor)) * np.hamming(number_of_taps)
+    taps /= taps.sum()
+
+    padded = np.pad(matrix, ((0, 0), (number_of_taps // 2, number_of_taps // 2)),
+                    mode='reflect', reflect_type='odd')
+    number_of_outputs = (matrix.shape[1] - 1) // factor + 1
+    result = np.zeros((matrix.shape[0], number_of_outputs))
+    for tap_index, tap in enumerate(taps):
+        result += tap * padded[:, tap_index:tap_index + factor * (number_of_outputs - 1) + 1:factor]
+    return result
+
+
+def _decimateSegment(matrix, times, target_times, factor, sample_spacing, maximum_stage_factor):
+    # Only filter the part of the recording the target times cover, with enough margin for the filters. Margin
+    # past either end of the recording is made up by odd reflection about the end sample, which keeps the level and
+    # slope there, so the first and last targets still fall inside the filtered times.
+    margin = 4 * max(factor, 1)
+    first_target = np.searchsorted(times, target_times[0])
+    last_target = np.searchsorted(times, target_times[-1], side='right')
+    first = max(first_target - margin, 0)
+    last = min(last_target + margin, len(times))
+    filtered = matrix[:, first:last]
+    filtered_times = times[first:last]
+    before = max(margin - first_target, 0)
+    after = max(last_target + margin - len(times), 0)
+    if before or after:
+        filtered = np.pad(filtered, ((0, 0), (before, after)), mode='reflect', reflect_type='odd')
+        filtered_times = np.concatenate((filtered_times[0] - sample_spacing * np.arange(before, 0, -1),
+                                         filtered_times,
+                                         filtered_times[-1] + sample_spacing * np.arange(1, after + 1)))
+    if factor > maximum_stage_factor:
+        block = factor // maximum_stage_factor
+        number_of_blocks = filtered.shape[1] // block
+        filtered = filtered[:, :number_of_blocks * block]
+        filtered = filtered.reshape(filtered.shape[0], number_of_blocks, block).mean(axis=2)
+        filtered_times = filtered_times[:number_of_blocks * block].reshape(number_of_blocks, block).mean(axis=1)
+        factor //= block
+    if factor > 1 and filtered.shape[1] > 1:
+        filtered = _firDecimate(filtered, factor)
+        filtered_times = filtered_times[::factor]
+
+    return resampleLinear(filtered, filtered_times, target_times)
+
+
+def resampleDecimate(matrix, times, target_times, maximum_stage_factor=10):
+    """
+    Decimates towards the target rate and linearly interpolates the result at the target times. Large factors are
+    first reduced with block averages (a boxcar, CIC style), then the last stage of at most maximum_stage_factor
+    uses a windowed sinc anti-alias FIR.
+    """
+    if len(times) < 2 or len(target_times) < 2:
+        return resampleLinear(matrix, times, target_times)
+
+    sample_spacing = np.median(np.diff(times))
+    target_spacing = np.median(np.diff(target_times))
+    factor = int(target_spacing // sample_spacing) if sample_spacing > 0 else 1
+
+    # Targets near either end of the recording need reflected padding, so they are decimated from their own short
+    # pieces and the rest of the recording is filtered without copying it
+    margin = 8 * max(factor, 1)
+    head = np.searchsorted(target_times, times[min(margin, len(times) - 1)])
+    tail = np.searchsorted(target_times, times[max(len(times) - 1 - margin, 0)], side='right')
+    if head >= tail:
+        return _decimateSegment(matrix, times, target_times, factor, sample_spacing, maximum_stage_factor)
+
+    pieces = [target_times[:head], target_times[head:tail], target_times[tail:]]
+    return np.concatenate([_decimateSegment(matrix, times, piece, factor, sample_spacing, maximum_stage_factor)
+                           for piece in pieces if len(piece)], axis=1)
+
+
+class Resampler(object):
+
+    _modes = {
+        'nearest': resampleNearest,
+        'decimate': resampleDecimate,
+        'linear': resampleLinear,
+        'mean': resampleMean,
+        'minmax': resampleMinMax,
+    }
+
+    def __init__(self, mode='nearest'):
+        self._mode = None
+        self.setMode(mode)
+
+    @classmethod
+    def addMode(cls, name, function):
+        # function is called as function(matrix, times, target_times) and returns a (channels x targets) matrix
+        cls._modes[name] = function
+
+    @classmethod
+    def getModes(cls):
+        return list(cls._modes)
+
+    def getMode(self):
+        return self._mode
+
+    def setMode(self, mode):
+        if mode not in self._modes:
+            raise ValueError('Unknown resampling mode \'{0}\''.format(mode))
+        self._mode = mode
+
+    def resample(self, matrix, times, target_times):
+        times = np.asarray(times, dtype=np.float64)
+        target_times = np.asarray(target_times, dtype=np.float64)
+        return self._modes[self._mode](matrix, times, target_times)
@@ -0,0 +1,231 @@
+# timeseriescache.py
+# ------------------
+# TimeseriesCache keeps the data frames downloaded from Blackfynn on disk so that rerunning a workflow does not
+# download the same recording again. Each entry is stored as binary numpy columns in a single .npz file, one array
+# per column so frames mixing channel values with a timestamp column are never pickled. Once the entries pass the
+# maximum size the least recently used are removed.
+
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+def _datetimeToStored(values):
+    # Returns datetimes as int64 nanoseconds (UTC when timezone aware) and the name of their timezone, or ''
+    values = pd.DatetimeIndex(values)
+    timezone = ''
+    if values.tz is not None:
+        timezone = str(values.tz)
+        values = values.tz_convert('UTC').tz_localize(None)
+    return values.values.astype('datetime64[ns]').astype(np.int64), timezone
+
+
+def _storedToDatetime(values, timezone):
+    values = pd.DatetimeIndex(values.astype('datetime64[ns]'))
+    if timezone:
+        values = values.tz_localize('UTC').tz_convert(timezone)
+    return values
+
+
+class TimeseriesCache(object):
+
+    def __init__(self, directory=None, maximum_size=2*1024**3):
+        # maximum_size is in bytes
+        self._directory = directory
+        self._maximum_size = maximum_size
+
+    def setDirectory(self, directory):
+        self._directory = directory
+
+    def setMaximumSize(self, maximum_size):
+        self._maximum_size = maximum_size
+        self._evict()
+
+    def getMaximumSize(self):
+        return self._maximum_size
+
+    def getSize(self):
+        # getSize: Returns the bytes taken by the cache's entries
+        return sum(size for filename, size, used in self._getEntries())
+
+    def getDirectory(self):
+        return self._directory
+
+    def isEnabled(self):
+        return self._directory is not None
+
+    def _getFilename(self, key):
+        # key is a tuple of (profile, dataset, package id, window), hashed so any characters are safe to use
+        key_string = '|'.join(str(part) for part in key)
+        return os.path.join(self._directory, hashlib.sha1(key_string.encode('utf-8')).hexdigest() + '.npz')
+
+    def load(self, key, modified):
+        """
+        Returns the cached data frame for key, or None if there is no entry or the entry was stored for a
+        different package modified stamp.
+        """
+        if not self.isEnabled():
+            return None
+
+        filename = self._getFilename(key)
+        if not os.path.isfile(filename):
+            return None
+
+        try:
+            with np.load(filename, allow_pickle=False) as stored:
+                if str(stored['modified']) != str(modified):
+                    return None
+                columns = stored['columns'].tolist()
+                column_timezones = stored['column_timezones'].tolist()
+                column_is_datetime = stored['column_is_datetime'].tolist()
+                column_values = [stored['column{0}'.format(column_index)] for column_index in range(len(columns))]
+                index_values = stored['index']
+                timezone = str(stored['timezone'])
+                is_datetime = bool(stored['is_datetime'])
+        except (IOError, OSError, KeyError, ValueError):
+            # A corrupt or outdated entry is treated as a miss, it will be overwritten by the next store
+            return None
+
+        self._touch(filename)
+        if is_datetime:
+            index = _storedToDatetime(index_values, timezone)
+        else:
+            index = pd.Index(index_values)
+
+        data = {}
+        for column, values, column_timezone, is_datetime_column in zip(columns, column_values, column_timezones,
+                                                                        column_is_datetime):
+            data[column] = _storedToDatetime(values, column_timezone) if is_datetime_column else values
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def store(self, key, modified, data_frame):
+        if not self.isEnabled():
+            return
+
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        index = data_frame.index
+        is_datetime = isinstance(index, pd.DatetimeIndex)
+        timezone = ''
+        if is_datetime:
+            index_values, timezone = _datetimeToStored(index)
+        else:
+            index_values = np.asarray(index)
+
+        columns = {}
+        column_timezones = []
+        column_is_datetime = []
+        for column_index, column in enumerate(data_frame.columns):
+            values = data_frame.iloc[:, column_index]
+            column_timezone = ''
+            is_datetime_column = pd.api.types.is_datetime64_any_dtype(values.dtype)
+            if is_datetime_column:
+                values, column_timezone = _datetimeToStored(values)
+            else:
+                values = np.ascontiguousarray(values.values)
+                if values.dtype == object:
+                    values = values.astype(str)
+            columns['column{0}'.format(column_index)] = values
+            column_timezones.append(column_timezone)
+            column_is_datetime.append(is_datetime_column)
+
+        self._write(key, modified=np.array(str(modified)),
+                    columns=np.array([str(column) for column in data_frame.columns]),
+                    column_timezones=np.array(column_timezones, dtype=str),
+                    column_is_datetime=np.array(column_is_datetime, dtype=bool),
+                    index=index_values,
+                    timezone=np.array(timezone),
+                    is_datetime=np.array(is_datetime),
+                    **columns)
+
+    def loadSampleRate(self, key, modified):
+        """
+        Returns the sample rate stored for a package key, or None if there is none for this modified stamp, so a
+        package's rate does not have to be detected again before its data can be looked up.
+        """
+        if not self.isEnabled():
+            return None
+
+        filename = self._getFilename(key + ('sample_rate',))
+        if not os.path.isfile(filename):
+            return None
+
+        try:
+            with np.load(filename, allow_pickle=False) as stored:
+                if str(stored['modified']) != str(modified):
+                    return None
+                sample_rate = float(stored['sample_rate'])
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+        self._touch(filename)
+        return sample_rate
+
+    def storeSampleRate(self, key, modified, sample_rate):
+        if not self.isEnabled():
+            return
+
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        self._write(key + ('sample_rate',), modified=np.array(str(modified)), sample_rate=np.array(sample_rate))
+
+    def _write(self, key, **arrays):
+        # Write to a temporary file first so an interrupted write never leaves a partial entry behind
+        handle, temporary_filename = tempfile.mkstemp(suffix='.npz.tmp', dir=self._directory)
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **arrays)
+        filename = self._getFilename(key)
+        os.replace(temporary_filename, filename)
+        self._evict(filename)
+
+    def _touch(self, filename):
+        # Entries are evicted by last use, which is kept as the file's modification time
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+    def _getEntries(self):
+        # Returns (filename, size, last use) for every entry
+        if not self.isEnabled() or not os.path.isdir(self._directory):
+            return []
+
+        entries = []
+        for name in os.listdir(self._directory):
+            if name.endswith('.npz'):
+                filename = os.path.join(self._directory, name)
+                try:
+                    status = os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((filename, status.st_size, status.st_mtime))
+        return entries
+
+    def _evict(self, keep_filename=None):
+        # Removes the least recently used entries until the cache fits its maximum size, keep_filename is never
+        # removed so an entry larger than the maximum still serves the next request
+        entries = sorted(self._getEntries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        for filename, entry_size, used in entries:
+            if size <= self._maximum_size:
+                break
+            if filename == keep_filename:
+                continue
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            size -= entry_size
+
+    def clear(self):
+        if not self.isEnabled() or not os.path.isdir(self._directory):
+            return
+
+        for filename in os.listdir(self._directory):
+            if filename.endswith('.npz'):
+                os.remove(os.path.join(self._directory, filename))
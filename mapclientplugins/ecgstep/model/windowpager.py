@@ -0,0 +1,72 @@
+# windowpager.py
+# --------------
+# WindowPager keeps only a few fixed length windows of a recording in memory during playback: the window holding
+# the playhead, and the windows either side of it. Windows are fetched on a worker thread ahead of the playhead
+# and dropped once the playhead has moved on, so memory stays bounded however long the recording is.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class WindowPager(object):
+
+    def __init__(self, fetch, window_length, recording_length, windows_ahead=1, windows_behind=1):
+        # fetch is called as fetch(start_time, length) on the worker thread and returns [channel data, times] with
+        # the times in seconds from start_time, as BlackfynnDataModel.getTimeseriesData does
+        self._fetch = fetch
+        self._window_length = float(window_length)
+        self._number_of_windows = max(int(np.ceil(recording_length / self._window_length)), 1)
+        self._windows_ahead = windows_ahead
+        self._windows_behind = windows_behind
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._windows = {}
+
+    def getWindowLength(self):
+        return self._window_length
+
+    def getWindowIndex(self, time):
+        return min(max(int(time // self._window_length), 0), self._number_of_windows - 1)
+
+    def getWindowStart(self, index):
+        return index * self._window_length
+
+    def getResidentWindows(self):
+        return sorted(self._windows)
+
+    def _load(self, index):
+        start_time = self.getWindowStart(index)
+        channel_data, times = self._fetch(start_time, self._window_length)
+        return [channel_data, np.asarray(times, dtype=np.float64) + start_time]
+
+    def setTime(self, time):
+        """
+        Makes the window holding time and its neighbours resident, requesting any that are missing, and drops every
+        other window. Returns the index of the window holding time.
+        """
+        index = self.getWindowIndex(time)
+        wanted = range(max(index - self._windows_behind, 0),
+                       min(index + self._windows_ahead + 1, self._number_of_windows))
+        for resident_index in list(self._windows):
+            if resident_index not in wanted:
+                self._windows.pop(resident_index).cancel()
+
+        # The worker fetches in request order, so the playhead's window comes first, then the ones ahead of it
+        for wanted_index in sorted(wanted, key=lambda wanted_index: (abs(wanted_index - index), -wanted_index)):
+            if wanted_index not in self._windows:
+                self._windows[wanted_index] = self._executor.submit(self._load, wanted_index)
+        return index
+
+    def getWindow(self, index, wait=False):
+        # getWindow: Returns [channel data, times] of a resident window, or None while it is still being fetched
+        #            unless wait is True. Errors raised by the fetch are raised here.
+        future = self._windows.get(index)
+        if future is None or (not wait and not future.done()):
+            return None
+        return future.result()
+
+    def shutdown(self):
+        for future in self._windows.values():
+            future.cancel()
+        self._windows = {}
+        self._executor.shutdown(wait=False)
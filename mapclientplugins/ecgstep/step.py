@@ -80,6 +80,10 @@ class ecgStep(WorkflowStepMountPoint):
         """
         if index == 0:
             self._portData0 = dataIn  # ecg_grid_points
+            # Port data normally arrives before execute creates the view, which then starts from it. A view that is
+            # still showing (the workflow re-running upstream) is moved to the new positions in place.
+            if self._view is not None:
+                self._view.setNodeCoordinatesData(dataIn)
         if index == 1:
             self._portData1 = dataIn
         if index == 3:
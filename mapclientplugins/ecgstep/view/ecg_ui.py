@@ -115,6 +115,9 @@ class Ui_MeshGeneratorWidget(object):
         self.lock_in_adjustment_pushButton = QtGui.QPushButton(self.groupBox_2)
         self.lock_in_adjustment_pushButton.setGeometry(QtCore.QRect(240, 80, 141, 21))
         self.lock_in_adjustment_pushButton.setObjectName("lock_in_adjustment_pushButton")
+        self.stackedPlot_checkBox = QtGui.QCheckBox(self.groupBox_2)
+        self.stackedPlot_checkBox.setGeometry(QtCore.QRect(110, 110, 271, 21))
+        self.stackedPlot_checkBox.setObjectName("stackedPlot_checkBox")
         self.verticalLayout_3.addWidget(self.groupBox_2)
         self.video_groupBox = QtGui.QGroupBox(self.scrollAreaWidgetContents_2)
         self.video_groupBox.setObjectName("video_groupBox")
@@ -215,6 +218,61 @@ class Ui_MeshGeneratorWidget(object):
         self.pushButton_2 = QtGui.QPushButton(self.blackfynn_groupBox)
         self.pushButton_2.setObjectName("pushButton_2")
         self.gridLayout_5.addWidget(self.pushButton_2, 7, 2, 1, 1)
+        self.streamDownload_checkBox = QtGui.QCheckBox(self.blackfynn_groupBox)
+        self.streamDownload_checkBox.setObjectName("streamDownload_checkBox")
+        self.gridLayout_5.addWidget(self.streamDownload_checkBox, 5, 1, 1, 1)
+        self.windowedPlayback_checkBox = QtGui.QCheckBox(self.blackfynn_groupBox)
+        self.windowedPlayback_checkBox.setObjectName("windowedPlayback_checkBox")
+        self.gridLayout_5.addWidget(self.windowedPlayback_checkBox, 5, 0, 1, 1)
+        self.playbackWindow_spinBox = QtGui.QSpinBox(self.blackfynn_groupBox)
+        self.playbackWindow_spinBox.setMinimum(1)
+        self.playbackWindow_spinBox.setMaximum(3600)
+        self.playbackWindow_spinBox.setProperty("value", 10)
+        self.playbackWindow_spinBox.setObjectName("playbackWindow_spinBox")
+        self.gridLayout_5.addWidget(self.playbackWindow_spinBox, 5, 3, 1, 1)
+        self.prefetchData_checkBox = QtGui.QCheckBox(self.blackfynn_groupBox)
+        self.prefetchData_checkBox.setObjectName("prefetchData_checkBox")
+        self.gridLayout_5.addWidget(self.prefetchData_checkBox, 4, 1, 1, 1)
+        self.download_progressBar = QtGui.QProgressBar(self.blackfynn_groupBox)
+        self.download_progressBar.setProperty("value", 0)
+        self.download_progressBar.setObjectName("download_progressBar")
+        self.gridLayout_5.addWidget(self.download_progressBar, 9, 0, 1, 3)
+        self.cancelDownload_button = QtGui.QPushButton(self.blackfynn_groupBox)
+        self.cancelDownload_button.setEnabled(False)
+        self.cancelDownload_button.setObjectName("cancelDownload_button")
+        self.gridLayout_5.addWidget(self.cancelDownload_button, 9, 3, 1, 1)
+        self.resampling_label = QtGui.QLabel(self.blackfynn_groupBox)
+        self.resampling_label.setObjectName("resampling_label")
+        self.gridLayout_5.addWidget(self.resampling_label, 10, 0, 1, 1)
+        self.resampling_comboBox = QtGui.QComboBox(self.blackfynn_groupBox)
+        self.resampling_comboBox.setObjectName("resampling_comboBox")
+        self.gridLayout_5.addWidget(self.resampling_comboBox, 10, 1, 1, 2)
+        self.robustSpectrum_checkBox = QtGui.QCheckBox(self.blackfynn_groupBox)
+        self.robustSpectrum_checkBox.setObjectName("robustSpectrum_checkBox")
+        self.gridLayout_5.addWidget(self.robustSpectrum_checkBox, 10, 3, 1, 1)
+        self.electrodePositions_button = QtGui.QPushButton(self.blackfynn_groupBox)
+        self.electrodePositions_button.setObjectName("electrodePositions_button")
+        self.gridLayout_5.addWidget(self.electrodePositions_button, 11, 1, 1, 2)
+        self.loadScaffold_button = QtGui.QPushButton(self.blackfynn_groupBox)
+        self.loadScaffold_button.setObjectName("loadScaffold_button")
+        self.gridLayout_5.addWidget(self.loadScaffold_button, 11, 3, 1, 1)
+        self.addElectrodeMesh_button = QtGui.QPushButton(self.blackfynn_groupBox)
+        self.addElectrodeMesh_button.setObjectName("addElectrodeMesh_button")
+        self.gridLayout_5.addWidget(self.addElectrodeMesh_button, 12, 1, 1, 2)
+        self.clearCache_button = QtGui.QPushButton(self.blackfynn_groupBox)
+        self.clearCache_button.setObjectName("clearCache_button")
+        self.gridLayout_5.addWidget(self.clearCache_button, 12, 3, 1, 1)
+        self.electrodeMeshes_listWidget = QtGui.QListWidget(self.blackfynn_groupBox)
+        self.electrodeMeshes_listWidget.setMaximumSize(QtCore.QSize(16777215, 80))
+        self.electrodeMeshes_listWidget.setObjectName("electrodeMeshes_listWidget")
+        self.gridLayout_5.addWidget(self.electrodeMeshes_listWidget, 13, 0, 1, 4)
+        self.exportFrames_label = QtGui.QLabel(self.blackfynn_groupBox)
+        self.exportFrames_label.setObjectName("exportFrames_label")
+        self.gridLayout_5.addWidget(self.exportFrames_label, 6, 0, 1, 1)
+        self.exportFrames_spinBox = QtGui.QSpinBox(self.blackfynn_groupBox)
+        self.exportFrames_spinBox.setMaximum(100000)
+        self.exportFrames_spinBox.setObjectName("exportFrames_spinBox")
+        self.gridLayout_5.addWidget(self.exportFrames_spinBox, 6, 1, 1, 1)
         self.blackfynnProfiles_groupBox = QtGui.QGroupBox(self.blackfynn_groupBox)
         self.blackfynnProfiles_groupBox.setObjectName("blackfynnProfiles_groupBox")
         self.horizontalLayout_5 = QtGui.QHBoxLayout(self.blackfynnProfiles_groupBox)
@@ -274,6 +332,7 @@ class Ui_MeshGeneratorWidget(object):
         self.pushButton_3.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "View data with video", None, QtGui.QApplication.UnicodeUTF8))
         self.viewVideo_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "View Video", None, QtGui.QApplication.UnicodeUTF8))
         self.lock_in_adjustment_pushButton.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Adjust mesh", None, QtGui.QApplication.UnicodeUTF8))
+        self.stackedPlot_checkBox.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Plot all channels", None, QtGui.QApplication.UnicodeUTF8))
         self.video_groupBox.setTitle(QtGui.QApplication.translate("MeshGeneratorWidget", "Video:", None, QtGui.QApplication.UnicodeUTF8))
         self.framesPerSecond_label.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Frames per second:", None, QtGui.QApplication.UnicodeUTF8))
         self.frameIndex_label.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Frame index:", None, QtGui.QApplication.UnicodeUTF8))
@@ -289,6 +348,31 @@ class Ui_MeshGeneratorWidget(object):
         self.blackfynnDatasets_pushButton.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Retrieve datasets", None, QtGui.QApplication.UnicodeUTF8))
         self.blackfynnTimeSeries_label.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Time series:", None, QtGui.QApplication.UnicodeUTF8))
         self.pushButton_2.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Upload to Blackfynn", None, QtGui.QApplication.UnicodeUTF8))
+        self.windowedPlayback_checkBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Only keep the part of the recording around the playhead in memory, fetching the next part during playback", None, QtGui.QApplication.UnicodeUTF8))
+        self.windowedPlayback_checkBox.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Windowed", None, QtGui.QApplication.UnicodeUTF8))
+        self.prefetchData_checkBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Fetch the first window of the selected time series into the disk cache in the background", None, QtGui.QApplication.UnicodeUTF8))
+        self.prefetchData_checkBox.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Prefetch", None, QtGui.QApplication.UnicodeUTF8))
+        self.playbackWindow_spinBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Seconds of the recording kept in memory around the playhead in windowed playback", None, QtGui.QApplication.UnicodeUTF8))
+        self.playbackWindow_spinBox.setSuffix(QtGui.QApplication.translate("MeshGeneratorWidget", " s", None, QtGui.QApplication.UnicodeUTF8))
+        self.streamDownload_checkBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Download the recording in chunks in the background", None, QtGui.QApplication.UnicodeUTF8))
+        self.streamDownload_checkBox.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Stream", None, QtGui.QApplication.UnicodeUTF8))
+        self.cancelDownload_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Cancel", None, QtGui.QApplication.UnicodeUTF8))
+        self.resampling_label.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Resampling:", None, QtGui.QApplication.UnicodeUTF8))
+        self.resampling_comboBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "How the data is resampled onto the mesh times", None, QtGui.QApplication.UnicodeUTF8))
+        self.robustSpectrum_checkBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Colour from the 1st to the 99th percentile of the data so spikes do not set the range", None, QtGui.QApplication.UnicodeUTF8))
+        self.robustSpectrum_checkBox.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Robust", None, QtGui.QApplication.UnicodeUTF8))
+        self.electrodePositions_button.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Load a JSON file of channel name to electrode position to interpolate the nodes from", None, QtGui.QApplication.UnicodeUTF8))
+        self.electrodePositions_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Electrode positions...", None, QtGui.QApplication.UnicodeUTF8))
+        self.loadScaffold_button.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Load a JSON scaffold description to move the electrode mesh to, keeping its colours", None, QtGui.QApplication.UnicodeUTF8))
+        self.loadScaffold_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Load scaffold...", None, QtGui.QApplication.UnicodeUTF8))
+        self.clearCache_button.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Delete the recordings kept on disk from earlier downloads", None, QtGui.QApplication.UnicodeUTF8))
+        self.clearCache_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Clear Cache", None, QtGui.QApplication.UnicodeUTF8))
+        self.addElectrodeMesh_button.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Load a JSON scaffold description of another electrode array to show alongside the others", None, QtGui.QApplication.UnicodeUTF8))
+        self.addElectrodeMesh_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Add electrode mesh...", None, QtGui.QApplication.UnicodeUTF8))
+        self.electrodeMeshes_listWidget.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Electrode meshes, untick one to hide it", None, QtGui.QApplication.UnicodeUTF8))
+        self.exportFrames_label.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "Frames:", None, QtGui.QApplication.UnicodeUTF8))
+        self.exportFrames_spinBox.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Number of time steps in the WebGL export, 0 exports one per video frame", None, QtGui.QApplication.UnicodeUTF8))
+        self.exportFrames_spinBox.setSpecialValueText(QtGui.QApplication.translate("MeshGeneratorWidget", "Video rate", None, QtGui.QApplication.UnicodeUTF8))
         self.blackfynnProfiles_groupBox.setTitle(QtGui.QApplication.translate("MeshGeneratorWidget", "Profiles:", None, QtGui.QApplication.UnicodeUTF8))
         self.addProfile_pushButton.setToolTip(QtGui.QApplication.translate("MeshGeneratorWidget", "Add profile", None, QtGui.QApplication.UnicodeUTF8))
         self.viewAll_button.setText(QtGui.QApplication.translate("MeshGeneratorWidget", "View All", None, QtGui.QApplication.UnicodeUTF8))
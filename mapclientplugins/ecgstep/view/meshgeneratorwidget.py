@@ -8,6 +8,7 @@ import types
 
 
 import json
+import os
 import webbrowser
 import numpy as np
 
@@ -17,7 +18,10 @@ from mapclient.view.utils import set_wait_cursor
 from mapclientplugins.ecgstep.view.ecg_ui import Ui_MeshGeneratorWidget
 from mapclientplugins.ecgstep.view.addprofile import AddProfileDialog
 from mapclientplugins.ecgstep.model.plot import Plot
-from mapclientplugins.ecgstep.model.blackfynnmesh import BlackfynnMesh
+from mapclientplugins.ecgstep.model.electrodemeshes import ElectrodeMeshes
+from mapclientplugins.ecgstep.model.downloadthread import DownloadThread
+from mapclientplugins.ecgstep.model.resampler import Resampler
+from mapclientplugins.ecgstep.model.windowpager import WindowPager
 
 class MeshGeneratorWidget(QtGui.QWidget):
 
@@ -29,6 +33,10 @@ class MeshGeneratorWidget(QtGui.QWidget):
         self._model.registerFrameIndexUpdateCallback(self._updateFrameIndex)
 
         self._ui.setupUi(self)
+        # Slider ticks are coalesced so at most one plot nudge happens per frame
+        self._adjust_data_timer = QtCore.QTimer(self)
+        self._adjust_data_timer.setSingleShot(True)
+        self._adjust_data_timer.setInterval(16)
         self._export_directory = export_directory
         self._doneCallback = None
         self._marker_mode_active = False
@@ -36,6 +44,8 @@ class MeshGeneratorWidget(QtGui.QWidget):
 
         self.time = 0
         self._electrode_mesh = None
+        self._electrode_meshes = None
+        self._electrode_mesh_descriptions = []  # (name, scaffold description) of meshes added besides the scaffold's
         self._node_coordinates_data = node_coordinates_data
         self._time_sequence = node_coordinates_data['time_array']
 
@@ -46,6 +56,20 @@ class MeshGeneratorWidget(QtGui.QWidget):
         self._makeConnections()
 
         self.plot = None
+        self.data = {}
+        self._resampler = Resampler()
+        self._robust_spectrum_percentiles = (1, 99)
+        self._electrode_positions = None
+        self._window_pager = None
+        self._playback_window = None
+        self._playback_window_data = None  # {'cache', 'times'} of the window in the mesh, self.data stays the plot's
+        self._ui.resampling_comboBox.addItems(Resampler.getModes())
+        self._ui.resampling_comboBox.setCurrentIndex(Resampler.getModes().index(self._resampler.getMode()))
+        self._download_thread = None
+        self._download_chunk_length = 10  # seconds of recording fetched per request when streaming
+        self._prefetch_thread = None
+        self._retired_prefetch_threads = []
+        self._prefetched_dataset = None
         self._ui.sceneviewer_widget.grid = []
 
     def _graphicsInitialized(self):
@@ -106,11 +130,24 @@ class MeshGeneratorWidget(QtGui.QWidget):
         self._ui.blackfynnDatasets_pushButton.clicked.connect(self._downloadDatasetsClicked)
         self._ui.blackfynnTimeSeries_pushButton.clicked.connect(self._downloadTimeSeriesClicked)
         self._ui.blackfynnDatasets_comboBox.currentIndexChanged.connect(self._blackfynnDatasetsChanged)
+        self._ui.blackfynnTimeSeries_comboBox.currentIndexChanged.connect(self._blackfynnTimeSeriesChanged)
+        self._ui.prefetchData_checkBox.clicked.connect(self._prefetchDataClicked)
         self._ui.downloadData_button.clicked.connect(self._downloadBlackfynnData)
+        self._ui.cancelDownload_button.clicked.connect(self._cancelDownloadClicked)
+        self._ui.resampling_comboBox.currentIndexChanged.connect(self._resamplingModeChanged)
+        self._ui.stackedPlot_checkBox.clicked.connect(self._stackedPlotClicked)
+        self._ui.robustSpectrum_checkBox.clicked.connect(self._robustSpectrumClicked)
+        self._ui.electrodePositions_button.clicked.connect(self._electrodePositionsClicked)
+        self._ui.addElectrodeMesh_button.clicked.connect(self._addElectrodeMeshClicked)
+        self._ui.loadScaffold_button.clicked.connect(self._loadScaffoldClicked)
+        self._ui.electrodeMeshes_listWidget.itemChanged.connect(self._electrodeMeshItemChanged)
+        self._ui.clearCache_button.clicked.connect(self._clearCacheClicked)
+        self._ui.sceneviewer_widget.nodePickedCallback = self._nodePicked
         # self._ui.UploadToBlackfynn_button.clicked.connect(self._exportWebGLJsonToBlackfynn)
         self._ui.lock_in_adjustment_pushButton.clicked.connect(self._lockInAdjustedData)
         self._ui.viewVideo_button.clicked.connect(self._playVideo)
-        self._ui.adjustData_Slider.valueChanged.connect(self._adjustData)
+        self._ui.adjustData_Slider.valueChanged.connect(lambda _value: self._adjust_data_timer.start())
+        self._adjust_data_timer.timeout.connect(self._adjustData)
         self._ui.tessellation_spinBox.valueChanged.connect(self._setTesselation)
 
     def _createFMAItem(self, parent, text, fma_id):
@@ -133,6 +170,8 @@ class MeshGeneratorWidget(QtGui.QWidget):
 
     def _doneButtonClicked(self):
         self._ui.dockWidget.setFloating(False)
+        self._stopWindowedPlayback()
+        self._stopDownloadThreads()
         self._model.done()
         self._model = None
         self._doneCallback()
@@ -150,75 +189,175 @@ class MeshGeneratorWidget(QtGui.QWidget):
             self._ui.timeValue_doubleSpinBox.setValue(value)
             if self.plot.line is not None:
                 self.plot.line.setValue(round(value, 3)) # adjust time marker
+            if self._window_pager is not None:
+                self._updatePlaybackWindow(value)
 
         self._ui.timeValue_doubleSpinBox.blockSignals(False)
 
-    def initialiseSpectrum(self, data):
-        # initialiseSpectrum modifies the scale of the spectrum to match a set of data
-
-        maximum = -1000000
-        minimum = 1000000
-        for key in data['cache']:
-            array_max = max(data['cache'][key])
-            array_min = min(data['cache'][key])
-            maximum = max(array_max, maximum)
-            minimum = min(array_min, minimum)
+    def initialiseSpectrum(self, minimum, maximum):
+        # initialiseSpectrum modifies the scale of the spectrum to match a range of data
         scene = self._model._region.findChildByName('ecg_plane').getScene()
         specMod = scene.getSpectrummodule()
         spectrum = specMod.findSpectrumByName('eegColourSpectrum2')
         spectrum_component = spectrum.getFirstSpectrumcomponent()
         spectrum_component.setRangeMaximum(maximum)
         spectrum_component.setRangeMinimum(minimum)
-        
+
+    def _updateSpectrum(self):
+        # _updateSpectrum: Sets the colour range of both spectrums from the data, the range is only computed once
+        #                  per dataset and optionally ignores outlying spikes
+        percentiles = self._robust_spectrum_percentiles if self._ui.robustSpectrum_checkBox.isChecked() else None
+        minimum, maximum = self.data['cache'].getRange(percentiles)
+        self.initialiseSpectrum(minimum, maximum)
+        self._electrode_meshes.setSpectrumRange(minimum, maximum)
+
     def _downsampledData(self):
-        # _downsampleData takes data from blackfynn and adjusts it to match the frequency of our exported mesh, 
-        #  which is defined in: self._time_sequence
-        
-        # create time sequence
-        video_time_sequence = []
-        for time_index, time_value in enumerate(self.data['times']):
-            # Only add data that to the mesh which is within the times of the video we will show
-            if time_value >= 0 and time_value <= self._model.video.videoLength:
-                video_time_sequence.append(time_value)
-        # find which indices we desire to downsample to
-        downsampling_indices = np.linspace(0, len(video_time_sequence), len(self._time_sequence)).round()
-        # downsample to our found indices and convert from dictionary to 2d array
-        downsampled_matrix = []
-        for key in self.data['cache']:
-            if 'time' not in key:
-                array_downsampled = []
-                array_values_in_video = []
-                for time_index, time_value in enumerate(self.data['times']):
-                    # Only add data that to the mesh which is within the times of the video we will show
-                    if time_value >= 0 and time_value <= self._model.video.videoLength:
-                        array_values_in_video.append(self.data['cache'][key][time_index])
-                # Loop through and pick out our downsampled indices
-                for index, val in enumerate(array_values_in_video):
-                    if index in downsampling_indices:
-                        array_downsampled.append(val)
-                # Add the final element
-                array_downsampled.append(array_values_in_video[-1])
-                # Add our array to the 2D matrix
-                downsampled_matrix.append(array_downsampled)
-        return downsampled_matrix
+        # _downsampleData takes data from blackfynn and adjusts it to match the frequency of our exported mesh,
+        #  which is defined in: self._time_sequence. The mesh times are spread evenly over the video and every
+        #  channel is resampled onto them at once with the selected resampling mode, giving a
+        #  (channels x mesh times) matrix
+        target_times = np.linspace(0, self._model.video.videoLength, len(self._time_sequence))
+        return self._resampler.resample(self.data['cache'].getMatrix(), self.data['times'], target_times)
+
+    def setNodeCoordinatesData(self, node_coordinates_data):
+        # setNodeCoordinatesData: Moves the electrode mesh to new scaffold positions, the colours are only written
+        #                         again if the time sequence the data is mapped onto has changed
+        time_sequence_changed = not np.array_equal(node_coordinates_data['time_array'], self._time_sequence)
+        self._node_coordinates_data = node_coordinates_data
+        self._time_sequence = node_coordinates_data['time_array']
+        if self._electrode_mesh is None or not self._electrode_mesh.is_generated():
+            return
+        self._electrode_mesh.update_geometry(node_coordinates_data)
+        if time_sequence_changed and self.data:
+            self._updateECGMesh(update_spectrum=False)
+
+    def _meshData(self):
+        # _meshData: Returns the (channels x times) matrix for the mesh and its time sequence, the whole recording
+        #            over the video or just the resident window in windowed playback
+        if self._window_pager is not None:
+            return self._playbackWindowData()
+        return self._downsampledData(), self._time_sequence
 
     def _renderECGMesh(self):
-
-        self._electrode_mesh = BlackfynnMesh(self._model.get_region(), self._node_coordinates_data)
+        if self._electrode_mesh is not None and self._electrode_mesh.is_generated():
+            self._applyElectrodePositions()
+            self._updateECGMesh()
+            return
+
+        # The scaffold's electrode mesh and any added ones are built together in the one region
+        self._electrode_meshes = ElectrodeMeshes(self._model.get_region())
+        self._electrode_mesh = self._electrode_meshes.addMesh('ecg_elements', self._node_coordinates_data)
+        for name, description in self._electrode_mesh_descriptions:
+            self._electrode_meshes.addMesh(name, description)
+        self._applyElectrodePositions()
 
         if self.data:
 
-            # prepare data
-            self.initialiseSpectrum(self.data)
-
             # pass the created data dictionaries to the mesh model
-            self._electrode_mesh.set_data_time_sequence(self._time_sequence)
-            self._electrode_mesh.set_data(self._downsampledData())
+            matrix, data_time_sequence = self._meshData()
+            self._electrode_meshes.setData(matrix, list(data_time_sequence))
 
-        self._electrode_mesh.generate_mesh()
-        self._electrode_mesh.drawMesh()
-        self._electrode_mesh.initialiseSpectrumFromDictionary(self.data['cache'])
+        self._electrode_meshes.generateMeshes()
+        self._updateSpectrum()
         self._ui.sceneviewer_widget.setModel(self._electrode_mesh)
+        self._refreshElectrodeMeshList()
+
+    def _updateECGMesh(self, update_spectrum=True):
+        # _updateECGMesh: Rewrites only the mesh colours for new or re-aligned data, the mesh itself is only built
+        #                 by the first render
+        self._electrode_meshes.updateData(*self._meshData())
+        if update_spectrum:
+            self._updateSpectrum()
+
+    def _applyElectrodePositions(self):
+        # _applyElectrodePositions: Passes the mesh the positions of the electrodes whose channels are in the data,
+        #                           the mesh assigns channels to nodes in order if there are none
+        names = []
+        if self._electrode_positions is not None and self.data:
+            names = [name for name in self._electrode_positions if name in self.data['cache']]
+        if names:
+            self._electrode_meshes.setElectrodePositions([self._electrode_positions[name] for name in names],
+                                                         [self.data['cache'].indexOf(name) for name in names])
+        else:
+            self._electrode_meshes.setElectrodePositions(None)
+
+    def _electrodePositionsClicked(self):
+        # _electrodePositionsClicked: Loads a JSON file of channel name -> electrode position, in the same frame as
+        #                             the scaffold positions at the first time
+        filename, _ = QtGui.QFileDialog.getOpenFileName(self, 'Electrode positions', '', 'JSON (*.json)')
+        if not filename:
+            return
+        with open(filename, 'r') as f:
+            self._electrode_positions = json.load(f)
+        if self.data and self._electrode_mesh is not None and self._electrode_mesh.is_generated():
+            self._applyElectrodePositions()
+            self._updateECGMesh(update_spectrum=False)
+
+    def _loadScaffoldClicked(self):
+        # _loadScaffoldClicked: Loads a refitted scaffold description, in the form port 0 provides, and moves the
+        #                       scaffold's electrode mesh onto it without touching the data
+        filename, _ = QtGui.QFileDialog.getOpenFileName(self, 'Scaffold', '', 'JSON (*.json)')
+        if not filename:
+            return
+        with open(filename, 'r') as f:
+            self.setNodeCoordinatesData(json.load(f))
+
+    def _addElectrodeMeshClicked(self):
+        # _addElectrodeMeshClicked: Loads the scaffold description of another electrode array, in the form port 0
+        #                           provides, and builds it alongside the meshes already shown
+        filename, _ = QtGui.QFileDialog.getOpenFileName(self, 'Electrode mesh', '', 'JSON (*.json)')
+        if not filename:
+            return
+        with open(filename, 'r') as f:
+            description = json.load(f)
+        name = os.path.splitext(os.path.basename(filename))[0]
+        names = [mesh_name for mesh_name, _ in self._electrode_mesh_descriptions] + ['ecg_elements']
+        while name in names:
+            name += '_'
+        self._electrode_mesh_descriptions.append((name, description))
+        if self._electrode_mesh is not None and self._electrode_mesh.is_generated():
+            # Only the new mesh is built, the others keep their nodes, elements and graphics
+            self._electrode_meshes.addMesh(name, description)
+            self._electrode_meshes.generateMeshes()
+            self._refreshElectrodeMeshList()
+
+    def _refreshElectrodeMeshList(self):
+        self._ui.electrodeMeshes_listWidget.blockSignals(True)
+        self._ui.electrodeMeshes_listWidget.clear()
+        for name in self._electrode_meshes.getMeshNames():
+            item = QtGui.QListWidgetItem(name, self._ui.electrodeMeshes_listWidget)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked if self._electrode_meshes.isVisible(name) else QtCore.Qt.Unchecked)
+        self._ui.electrodeMeshes_listWidget.blockSignals(False)
+
+    def _electrodeMeshItemChanged(self, item):
+        self._electrode_meshes.setVisibility(item.text(), item.checkState() == QtCore.Qt.Checked)
+
+    def _clearCacheClicked(self):
+        # _clearCacheClicked: Deletes the recordings and sample rates kept on disk, the next download fetches them
+        #                     from Blackfynn again
+        self._blackfynn_data_model.clearTimeseriesCache()
+
+    def _resamplingModeChanged(self, index):
+        self._resampler.setMode(self._ui.resampling_comboBox.currentText())
+        if self.data:
+            self._renderECGMesh()
+
+    def _robustSpectrumClicked(self):
+        if self.data and self._electrode_mesh is not None and self._electrode_mesh.is_generated():
+            self._updateSpectrum()
+
+    def _stackedPlotClicked(self):
+        if self.plot is not None:
+            self.plot.setStacked(self._ui.stackedPlot_checkBox.isChecked())
+
+    def _nodePicked(self, node_identifier):
+        # _nodePicked: Highlights the channel that colours the picked electrode node in the plot
+        if self.plot is None or self._electrode_mesh is None:
+            return
+        channel_index = self._electrode_meshes.getChannelIndexForNode(node_identifier)
+        if channel_index is not None:
+            self.plot.highlightChannel(self.data['cache'].getNames()[channel_index])
 
     def _setTesselation(self):
         self._model.setTessellation(self._ui.tessellation_spinBox.value())
@@ -230,6 +369,8 @@ class MeshGeneratorWidget(QtGui.QWidget):
 
     def _timeValueChanged(self, value):
         self._model.setTimeValue(value)
+        if self._window_pager is not None:
+            self._updatePlaybackWindow(value)
 
     def _timeDurationChanged(self, value):
         self._model.setTimeDuration(value)
@@ -268,33 +409,191 @@ class MeshGeneratorWidget(QtGui.QWidget):
         return self._blackfynn_data_model.getDatasets(self._ui.profiles_comboBox.currentText(), refresh=True)
 
     def _downloadDatasetsClicked(self):
-        datasets = self._retrieveDatasets()
+        self._retrieveDatasets()
         self._ui.blackfynnDatasets_comboBox.clear()
-        self._ui.blackfynnDatasets_comboBox.addItems([ds.name for ds in datasets])
+        self._ui.blackfynnDatasets_comboBox.addItems(
+            self._blackfynn_data_model.getDatasetNames(self._ui.profiles_comboBox.currentText()))
         self._updateBlackfynnUi()
 
     @set_wait_cursor
     def _retrieveDataset(self):
-        return self._blackfynn_data_model.getDataset(self._ui.profiles_comboBox.currentText(),
-                                                self._ui.blackfynnDatasets_comboBox.currentText(), refresh=True)
+        profile_name = self._ui.profiles_comboBox.currentText()
+        dataset_name = self._ui.blackfynnDatasets_comboBox.currentText()
+        # A finished prefetch of this dataset has already refreshed its listing
+        refresh = self._prefetched_dataset != (profile_name, dataset_name)
+        return self._blackfynn_data_model.getDataset(profile_name, dataset_name, refresh=refresh)
 
     def _downloadTimeSeriesClicked(self):
-        dataset = self._retrieveDataset()
+        self._retrieveDataset()
         self._ui.blackfynnTimeSeries_comboBox.clear()
-        self._ui.blackfynnTimeSeries_comboBox.addItems([ds.name for ds in dataset])
+        self._ui.blackfynnTimeSeries_comboBox.addItems(
+            self._blackfynn_data_model.getPackageNames(self._ui.profiles_comboBox.currentText(),
+                                                       self._ui.blackfynnDatasets_comboBox.currentText()))
         self._updateBlackfynnUi()
 
     def _downloadBlackfynnData(self):
-        self.data = {}
+        self._stopWindowedPlayback()
+        if self._ui.windowedPlayback_checkBox.isChecked():
+            self._startWindowedPlayback()
+            return
+
+        if self._ui.streamDownload_checkBox.isChecked():
+            self._startStreamingDownload()
+            return
+
         blackfynnOutput = self._blackfynn_data_model.getTimeseriesData(self._ui.profiles_comboBox.currentText(),
                                                         self._ui.blackfynnDatasets_comboBox.currentText(),
                                                         self._ui.blackfynnTimeSeries_comboBox.currentText(),
                                                         self._model.video.videoLength)
+        self._setBlackfynnData(blackfynnOutput)
+
+    def _setBlackfynnData(self, blackfynnOutput):
+        self.data = {}
         self.data['cache'] = blackfynnOutput[0]
         self.data['times'] = blackfynnOutput[1]
-        self.plot = Plot(self.data)
+        self.plot = Plot(self.data, self._ui.stackedPlot_checkBox.isChecked())
         self._renderECGMesh()
 
+    def _startWindowedPlayback(self):
+        # _startWindowedPlayback: Keeps only the windows of the recording around the playhead in memory and in the
+        #                         mesh, fetching the next window on a worker thread while the current one plays
+        profile_name = self._ui.profiles_comboBox.currentText()
+        dataset_name = self._ui.blackfynnDatasets_comboBox.currentText()
+        timeseries_name = self._ui.blackfynnTimeSeries_comboBox.currentText()
+        self._window_pager = WindowPager(
+            lambda start_time, length: self._blackfynn_data_model.getTimeseriesData(
+                profile_name, dataset_name, timeseries_name, length, start_time=start_time),
+            self._ui.playbackWindow_spinBox.value(), self._model.video.videoLength)
+        self._playback_window = self._window_pager.setTime(self._model._current_time)
+        try:
+            window = self._window_pager.getWindow(self._playback_window, wait=True)
+        except Exception as e:
+            self._stopWindowedPlayback()
+            QtGui.QMessageBox.warning(self, 'Blackfynn download', 'Download failed: {0}'.format(e))
+            return
+
+        # The plot, its time adjustment and the spectrum only apply to the first window, so adjusting is turned off
+        # while later windows page through the mesh. Only the current window is in memory, so the WebGL export,
+        # which needs the whole video, is turned off too.
+        self._ui.adjustData_Slider.setEnabled(False)
+        self._ui.lock_in_adjustment_pushButton.setEnabled(False)
+        self._ui.pushButton.setEnabled(False)
+        self._ui.playbackWindow_spinBox.setEnabled(False)
+        self._playback_window_data = {'cache': window[0], 'times': window[1]}
+        self._setBlackfynnData(window)
+
+    def _stopWindowedPlayback(self):
+        if self._window_pager is not None:
+            self._window_pager.shutdown()
+            self._window_pager = None
+            self._playback_window = None
+            self._playback_window_data = None
+            self._ui.adjustData_Slider.setEnabled(True)
+            self._ui.lock_in_adjustment_pushButton.setEnabled(True)
+            self._ui.pushButton.setEnabled(True)
+            self._ui.playbackWindow_spinBox.setEnabled(True)
+
+    def _updatePlaybackWindow(self, time):
+        # _updatePlaybackWindow: Shows the window holding the playhead once it has been fetched, until then the
+        #                        previous window stays in the mesh and this is tried again on the next frame
+        index = self._window_pager.setTime(time)
+        if index == self._playback_window:
+            return
+        try:
+            window = self._window_pager.getWindow(index)
+        except Exception as e:
+            self._stopWindowedPlayback()
+            QtGui.QMessageBox.warning(self, 'Blackfynn download', 'Download failed: {0}'.format(e))
+            return
+        if window is not None:
+            self._playback_window = index
+            self._playback_window_data = {'cache': window[0], 'times': window[1]}
+            self._updateECGMesh(update_spectrum=False)
+
+    def _playbackWindowData(self):
+        # _playbackWindowData: Returns the current window resampled at one step per video frame, with the mesh
+        #                      times of those steps
+        start_time = self._window_pager.getWindowStart(self._playback_window)
+        window_length = self._window_pager.getWindowLength()
+        number_of_steps = max(int(round(window_length * self._model.getFramesPerSecond())) + 1, 2)
+        data_times = np.linspace(start_time, start_time + window_length, number_of_steps)
+        window_data = self._playback_window_data
+        matrix = self._resampler.resample(window_data['cache'].getMatrix(), window_data['times'], data_times)
+        return matrix, self._meshTimes(data_times)
+
+    def _meshTimes(self, data_times):
+        # _meshTimes: Maps times in the recording onto the mesh time sequence, which spans the video
+        return np.interp(data_times, [0, self._model.video.videoLength],
+                         [self._time_sequence[0], self._time_sequence[-1]])
+
+    def _startStreamingDownload(self):
+        # _startStreamingDownload: Fetches the selected time series in chunks on a worker thread so the UI stays
+        #                          responsive, progress is shown in the Blackfynn group box
+        if self._download_thread is not None:
+            return
+
+        profile_name = self._ui.profiles_comboBox.currentText()
+        dataset_name = self._ui.blackfynnDatasets_comboBox.currentText()
+        timeseries_name = self._ui.blackfynnTimeSeries_comboBox.currentText()
+        length = self._model.video.videoLength
+        chunk_length = self._download_chunk_length
+
+        def download(progress_callback, is_cancelled):
+            return self._blackfynn_data_model.getTimeseriesData(profile_name, dataset_name, timeseries_name, length,
+                                                                chunk_length, progress_callback, is_cancelled)
+
+        self._download_thread = DownloadThread(download, self)
+        self._download_thread.progressChanged.connect(self._downloadProgressChanged)
+        self._download_thread.downloadFinished.connect(self._streamingDownloadFinished)
+        self._download_thread.downloadFailed.connect(self._streamingDownloadFailed)
+        self._download_thread.downloadCancelled.connect(self._streamingDownloadEnded)
+        self._ui.download_progressBar.setValue(0)
+        self._ui.downloadData_button.setEnabled(False)
+        self._ui.cancelDownload_button.setEnabled(True)
+        self._download_thread.start()
+
+    def _downloadProgressChanged(self, done, total):
+        self._ui.download_progressBar.setMaximum(total)
+        self._ui.download_progressBar.setValue(done)
+
+    def _cancelDownloadClicked(self):
+        if self._download_thread is not None:
+            self._download_thread.cancel()
+
+    def _stopDownloadThreads(self):
+        # _stopDownloadThreads: Cancels the download and every prefetch and waits for their threads to finish, so
+        #                       none is destroyed while running or reports back after the step is done
+        threads = [self._download_thread, self._prefetch_thread] + self._retired_prefetch_threads
+        self._download_thread = None
+        self._prefetch_thread = None
+        self._retired_prefetch_threads = []
+        for thread in threads:
+            if thread is not None:
+                thread.cancel()
+                thread.wait()
+
+    def _streamingDownloadFinished(self, blackfynnOutput):
+        # Signals queued by a download stopped with the step are ignored
+        if self.sender() is not self._download_thread:
+            return
+        self._streamingDownloadEnded()
+        if blackfynnOutput is not None:
+            self._setBlackfynnData(blackfynnOutput)
+
+    def _streamingDownloadFailed(self, message):
+        if self.sender() is not self._download_thread:
+            return
+        self._streamingDownloadEnded()
+        QtGui.QMessageBox.warning(self, 'Blackfynn download', 'Download failed: {0}'.format(message))
+
+    def _streamingDownloadEnded(self):
+        if self._download_thread is None:
+            return
+        self._download_thread.wait()
+        self._download_thread = None
+        self._ui.downloadData_button.setEnabled(True)
+        self._ui.cancelDownload_button.setEnabled(False)
+
     def _updateBlackfynnUi(self):
         valid_profiles = False
         if self._ui.profiles_comboBox.count() > 0:
@@ -316,7 +615,64 @@ class MeshGeneratorWidget(QtGui.QWidget):
         self._updateBlackfynnUi()
 
     def _blackfynnDatasetsChanged(self, index):
-        print(index)
+        # _blackfynnDatasetsChanged: Starts prefetching the newly selected dataset's package listing in the
+        #                            background, cancelling the prefetch of any previous selection
+        self._cancelPrefetch()
+        if index >= 0:
+            self._startPrefetch()
+
+    def _blackfynnTimeSeriesChanged(self, index):
+        # _blackfynnTimeSeriesChanged: When data prefetching is ticked, starts fetching the first window of the
+        #                              selected time series into the disk cache, cancelling any earlier prefetch
+        if index >= 0 and self._ui.prefetchData_checkBox.isChecked():
+            self._cancelPrefetch()
+            self._startPrefetch(self._ui.blackfynnTimeSeries_comboBox.currentText())
+
+    def _prefetchDataClicked(self):
+        if self._ui.prefetchData_checkBox.isChecked():
+            self._blackfynnTimeSeriesChanged(self._ui.blackfynnTimeSeries_comboBox.currentIndex())
+        else:
+            self._cancelPrefetch()
+
+    def _startPrefetch(self, package_name=None):
+        # _startPrefetch: Prefetches the selected dataset's listing, or the first video window of one of its
+        #                 packages, on a worker thread. The window is streamed so cancelling stops it between chunks.
+        profile_name = self._ui.profiles_comboBox.currentText()
+        dataset_name = self._ui.blackfynnDatasets_comboBox.currentText()
+        if not profile_name or not dataset_name:
+            return
+
+        package_names = [package_name] if package_name else None
+        length = self._model.video.videoLength if package_names else None
+
+        def prefetch(progress_callback, is_cancelled):
+            return self._blackfynn_data_model.prefetchDataset(profile_name, dataset_name, length,
+                                                              progress_callback, is_cancelled, package_names,
+                                                              self._download_chunk_length)
+
+        self._prefetch_thread = DownloadThread(prefetch, self)
+        self._prefetch_thread.downloadFinished.connect(self._prefetchFinished)
+        self._prefetch_thread.finished.connect(self._prefetchThreadFinished)
+        self._prefetch_thread.start()
+
+    def _cancelPrefetch(self):
+        self._prefetched_dataset = None
+        if self._prefetch_thread is not None:
+            # The thread stops at its next check, keep it referenced until it has finished running
+            self._prefetch_thread.cancel()
+            self._retired_prefetch_threads.append(self._prefetch_thread)
+            self._prefetch_thread = None
+
+    def _prefetchFinished(self, prefetched_dataset):
+        if self.sender() is self._prefetch_thread:
+            self._prefetched_dataset = prefetched_dataset
+
+    def _prefetchThreadFinished(self):
+        thread = self.sender()
+        if thread in self._retired_prefetch_threads:
+            self._retired_prefetch_threads.remove(thread)
+        elif thread is self._prefetch_thread:
+            self._prefetch_thread = None
 
     def _playVideo(self):
         if self.data:
@@ -326,6 +682,8 @@ class MeshGeneratorWidget(QtGui.QWidget):
             self._model.video.playVideo()
 
     def _adjustData(self):
+        if self.plot is None:
+            return
         newOffset = self._ui.adjustData_Slider.value()/100
         self.plot.nudgePlotStart(newOffset)
         self._model.video.line = self.plot.line
@@ -334,7 +692,11 @@ class MeshGeneratorWidget(QtGui.QWidget):
     def _lockInAdjustedData(self):
         newOffset = self._ui.adjustData_Slider.value()/100
         self.data = self.plot.nudgeDataStart(newOffset)
-        self._renderECGMesh()
+        if self._electrode_mesh is not None and self._electrode_mesh.is_generated():
+            # Shifting the data in time leaves its range unchanged, so only the colours are rewritten
+            self._updateECGMesh(update_spectrum=False)
+        else:
+            self._renderECGMesh()
 
 
 
@@ -346,25 +708,38 @@ class MeshGeneratorWidget(QtGui.QWidget):
     def _exportDataJson(self):
         export_data = {'values': {}}
         for key in self.data['cache']:
-            export_data['values'][key] = self.data['cache'][key]
-        export_data['times'] = self.data['times']
+            export_data['values'][key] = self.data['cache'][key].tolist()
+        export_data['times'] = list(self.data['times'])
         with open('ecgDataFull.json', 'w') as fp:
             json.dump(export_data, fp)
 
+    def _exportTimes(self):
+        # _exportTimes: Returns the data times and matching mesh times of the WebGL export steps, either the number
+        #               of frames set in the UI or one per video frame
+        number_of_steps = self._ui.exportFrames_spinBox.value()
+        if number_of_steps == 0:
+            number_of_steps = int(round(self._model.video.videoLength * self._model.getFramesPerSecond())) + 1
+        number_of_steps = max(number_of_steps, 2)
+        data_times = np.linspace(0, self._model.video.videoLength, number_of_steps)
+        return data_times, self._meshTimes(data_times)
+
     def _exportWebGLJson(self):
         """
         Export graphics into JSON formats. Returns an array containing the
         string buffers for each export
         """
-        downsample_rate = 100
-
-        # Scale down our data (every 10th value) for exporting
-        ECGmatrix = []
-        for key in self.data['cache']:
-            ECGmatrix.append(self.data['cache'][key][0::downsample_rate])
-        for i in range(len(ECGmatrix)):
-            ECGmatrix[i].append(ECGmatrix[i][-1])
-        ECGtimes = np.linspace(self._time_sequence[0], self._time_sequence[-1], len(ECGmatrix[:][0]))
+        if not self.data or self._electrode_mesh is None or not self._electrode_mesh.is_generated():
+            return
+        if self._window_pager is not None:
+            # Windowed playback only holds the window around the playhead, not the whole video
+            return
+
+        # Resample the data at the data times of the export steps and give the mesh exactly those steps, so every
+        # exported frame is the data at its own time rather than an interpolation of the mesh time steps. The mesh
+        # keeps the export steps until the data next changes.
+        export_data_times, ECGtimes = self._exportTimes()
+        ECGmatrix = self._resampler.resample(self.data['cache'].getMatrix(), self.data['times'], export_data_times)
+        self._electrode_meshes.updateData(ECGmatrix, ECGtimes)
 
         # Set up our scene resource
         ecg_region = self._model._region.findChildByName('ecg_plane')
@@ -472,6 +847,8 @@ def mousePressEvent(self, event):
             self.nodeKey = node.getIdentifier()
             self.node = node
             self.grid = []
+            if getattr(self, 'nodePickedCallback', None) is not None:
+                self.nodePickedCallback(self.nodeKey)
 
         # return sceneviewers 'mouspressevent' function to its version for navigation
         self._calculatePointOnPlane = None
@@ -0,0 +1,48 @@
+# conftest.py
+# -----------
+# The model modules are imported without running mapclientplugins/ecgstep/__init__.py, which registers the step
+# with the MAP Client and so imports PySide and mapclient. The tests need neither, nor a Blackfynn account: data
+# comes from fakeblackfynn.
+
+import os
+import sys
+import types
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _registerPackage(name, path):
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [path]
+        sys.modules[name] = package
+
+
+_registerPackage('mapclientplugins', os.path.join(_ROOT, 'mapclientplugins'))
+_registerPackage('mapclientplugins.ecgstep', os.path.join(_ROOT, 'mapclientplugins', 'ecgstep'))
+
+
+@pytest.fixture
+def fake_model():
+    """
+    Returns a function making a BlackfynnDataModel served by a FakeBlackfynn with one synthetic dataset 'Check',
+    ready for getTimeseriesData with the profile 'check'.
+    """
+    from mapclientplugins.ecgstep.model.blackfynndatamodel import BlackfynnDataModel
+    from mapclientplugins.ecgstep.model.fakeblackfynn import FakeBlackfynn
+
+    def makeFakeModel(number_of_channels=4, sample_rate=100, duration=60.0, number_of_packages=1,
+                      package_type='TimeSeries'):
+        backend = FakeBlackfynn()
+        backend.addSyntheticDataset('Check', number_of_channels=number_of_channels, sample_rate=sample_rate,
+                                    duration=duration, number_of_packages=number_of_packages,
+                                    package_type=package_type)
+        model = BlackfynnDataModel(client_factory=backend.connect)
+        model.addProfile({'name': 'check', 'token': '', 'secret': ''})
+        model.getDatasets('check', refresh=True)
+        model.getDataset('check', 'Check', refresh=True)
+        return model
+
+    return makeFakeModel
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapclientplugins.ecgstep.model.fakeblackfynn import FakePackage
+
+
+def test_relative_times_of_datetime_index(fake_model):
+    model = fake_model()
+    index = pd.DatetimeIndex(pd.to_datetime(pd.Timestamp('2019-01-01', tz='UTC').value +
+                                            np.arange(5) * 250000000, utc=True))
+    assert np.array_equal(model._relativeTimes(index), [0.0, 0.25, 0.5, 0.75, 1.0])
+
+
+def test_relative_times_of_sample_index(fake_model):
+    model = fake_model()
+    assert np.array_equal(model._relativeTimes(pd.RangeIndex(4), 2), [0.0, 0.5, 1.0, 1.5])
+
+
+def test_streamed_tabular_matches_single_request(fake_model):
+    # A Tabular package streamed in chunks gives the same channels and times as one request
+    model = fake_model(package_type='Tabular')
+    streamed_data, streamed_times = model.getTimeseriesData('check', 'Check', 'Tabular 1', 5, chunk_length=1)
+    data, times = model.getTimeseriesData('check', 'Check', 'Tabular 1', 5)
+    assert streamed_data.getNames() == data.getNames()
+    # The fake's noise is drawn per request, so only the signal under it has to agree
+    assert streamed_data.getMatrix().shape == data.getMatrix().shape
+    assert np.allclose(streamed_data.getMatrix(), data.getMatrix(), atol=0.25)
+    assert np.array_equal(streamed_times, times)
+
+
+def test_second_request_is_served_from_cache(fake_model, tmp_path):
+    model = fake_model(package_type='Tabular')
+    model.setCacheDirectory(str(tmp_path))
+    data, times = model.getTimeseriesData('check', 'Check', 'Tabular 1', 5)
+    # Any download on the second request fails
+    package = model._findPackage('check', 'Check', 'Tabular 1')
+    package.get_data = None
+    cached_data, cached_times = model.getTimeseriesData('check', 'Check', 'Tabular 1', 5)
+    assert np.array_equal(cached_data.getMatrix(), data.getMatrix())
+    assert np.array_equal(cached_times, times)
+
+
+def test_cached_sample_rate_avoids_detection(fake_model, tmp_path):
+    # A later session finds the Tabular rate in the disk cache, so cached data needs no request at all
+    model = fake_model(package_type='Tabular')
+    model.setCacheDirectory(str(tmp_path))
+    data, times = model.getTimeseriesData('check', 'Check', 'Tabular 1', 5)
+    model._sample_rates = {}
+    package = model._findPackage('check', 'Check', 'Tabular 1')
+    package.get_data = None
+    cached_data, cached_times = model.getTimeseriesData('check', 'Check', 'Tabular 1', 5)
+    assert np.array_equal(cached_data.getMatrix(), data.getMatrix())
+    assert np.array_equal(cached_times, times)
+
+
+def _addTabularCopy(model):
+    # Adds a Tabular package recording the same signal as the dataset's TimeSeries package
+    dataset = model.getDataset('check', 'Check')
+    timeseries_package = dataset.items[0]
+    dataset.addPackage(FakePackage(timeseries_package._backend, 'Tabular 1', 'Tabular',
+                                   len(timeseries_package.channels), timeseries_package.sample_rate, 60.0, seed=0))
+    model.getDataset('check', 'Check', refresh=True)
+
+
+def test_mixed_packages_align(fake_model):
+    # A TimeSeries package and a Tabular package of the same recording merge into identical rows
+    model = fake_model()
+    _addTabularCopy(model)
+    data, times = model.getMultipleTimeseriesData('check', 'Check', ['TimeSeries 1', 'Tabular 1'], 5)
+    matrix = data.getMatrix()
+    assert times[0] == 0.0
+    assert np.allclose(matrix[:len(matrix) // 2], matrix[len(matrix) // 2:])
+
+
+def test_unknown_package_name_raises(fake_model):
+    model = fake_model()
+    with pytest.raises(ValueError):
+        model.getMultipleTimeseriesData('check', 'Check', ['TimeSeries 1', 'No such package'], 5)
+
+
+def test_channel_subset_is_fetched_alone(fake_model):
+    # Only the selected channels of a TimeSeries package are requested
+    model = fake_model(number_of_packages=2)
+    package = model._findPackage('check', 'Check', 'TimeSeries 2')
+    requested = []
+    get_data = package.get_data
+
+    def recordingGetData(**arguments):
+        requested.append(arguments.get('channels'))
+        return get_data(**arguments)
+
+    package.get_data = recordingGetData
+    data, times = model.getMultipleTimeseriesData('check', 'Check', ['TimeSeries 1', 'TimeSeries 2'], 5,
+                                                  channels={'TimeSeries 2': ['ch2', 'ch3']})
+    assert [channel.name for channel in requested[0]] == ['ch2', 'ch3']
+    assert data.getNames() == ['ch1', 'TimeSeries 1/ch2', 'TimeSeries 1/ch3', 'ch4',
+                               'TimeSeries 2/ch2', 'TimeSeries 2/ch3']
+
+
+def test_uncovered_times_are_nan(fake_model):
+    # A package starting a second after the first has no values for that second
+    model = fake_model(number_of_packages=2, sample_rate=100)
+    model._findPackage('check', 'Check', 'TimeSeries 2').start += 1000000
+    data, times = model.getMultipleTimeseriesData('check', 'Check', ['TimeSeries 1', 'TimeSeries 2'], 5)
+    matrix = data.getMatrix()
+    late_rows = matrix[4:]
+    assert np.all(np.isnan(late_rows[:, times < 1.0]))
+    assert not np.any(np.isnan(late_rows[:, (times >= 1.0) & (times <= times[-1] - 1.0)]))
+    assert not np.any(np.isnan(matrix[:4]))
+    assert np.isfinite(data.getRange()).all()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('opencmiss.zinc')
+
+from opencmiss.zinc.context import Context
+from opencmiss.zinc.field import Field
+
+from mapclientplugins.ecgstep.model.blackfynnmesh import BlackfynnMesh
+
+
+def makePlateDescription(nodes_count_across, nodes_count_up, number_of_times, step=0.0):
+    """
+    Returns a time based node description of a flat unit plate with the given number of nodes, in the form the
+    scaffold port provides. The plate rises by step each time, so a position read at the wrong time shows up.
+    """
+    times = list(np.linspace(0.0, 1.0, number_of_times))
+    x, y = np.meshgrid(np.linspace(0.0, 1.0, nodes_count_across), np.linspace(0.0, 1.0, nodes_count_up))
+    description = {'time_array': times,
+                   'elements_count_across': nodes_count_across - 1,
+                   'elements_count_up': nodes_count_up - 1}
+    for node_identifier, (node_x, node_y) in enumerate(zip(x.ravel(), y.ravel())):
+        description['{0}'.format(node_identifier)] = [[node_x, node_y, step * index]
+                                                      for index in range(number_of_times)]
+    return description
+
+
+def nodeParameters(mesh, times, data_times):
+    # Every node's coordinates at each scaffold time and colour at each data time, evaluated through a field cache
+    field_module = mesh.get_region().getFieldmodule()
+    nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+    coordinates = field_module.findFieldByName('coordinates')
+    colour = field_module.findFieldByName('colour2')
+    cache = field_module.createFieldcache()
+    parameters = []
+    for node_identifier in mesh.get_node_identifiers():
+        cache.setNode(nodes.findNodeByIdentifier(int(node_identifier)))
+        for time_value in times:
+            cache.setTime(time_value)
+            parameters.extend(coordinates.evaluateReal(cache, 3)[1])
+        for time_value in data_times:
+            cache.setTime(time_value)
+            parameters.append(colour.evaluateReal(cache, 1)[1])
+    return np.array(parameters)
+
+
+def test_bulk_load_matches_per_node_load():
+    # The EX bulk path and the per node path give every node the same coordinates and colours at every time,
+    # after generate_mesh, update_data and update_geometry
+    description = makePlateDescription(8, 8, 5, step=0.1)
+    refitted_description = makePlateDescription(8, 8, 5, step=0.15)
+    random_state = np.random.RandomState(0)
+    data = random_state.standard_normal((16, 5))
+    new_data = random_state.standard_normal((16, 7))
+    new_data_times = list(np.linspace(0.0, 1.0, 7))
+
+    generated = []
+    updated = []
+    refitted = []
+    for bulk_load in (True, False):
+        context = Context('test')
+        mesh = BlackfynnMesh(context.getDefaultRegion(), description)
+        mesh.set_bulk_load(bulk_load)
+        mesh.set_data_time_sequence(description['time_array'])
+        mesh.set_data(data)
+        mesh.generate_mesh()
+        generated.append(nodeParameters(mesh, description['time_array'], description['time_array']))
+        mesh.update_data(new_data, new_data_times)
+        updated.append(nodeParameters(mesh, description['time_array'], new_data_times))
+        mesh.update_geometry(refitted_description)
+        refitted.append(nodeParameters(mesh, description['time_array'], new_data_times))
+
+    assert np.allclose(generated[0], generated[1])
+    assert np.allclose(updated[0], updated[1])
+    assert np.allclose(refitted[0], refitted[1])
+    assert not np.allclose(refitted[1], updated[1])
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('opencmiss.zinc')
+
+from opencmiss.zinc.context import Context
+from opencmiss.zinc.field import Field
+
+from mapclientplugins.ecgstep.model.electrodemeshes import ElectrodeMeshes
+from test_blackfynnmesh import makePlateDescription, nodeParameters
+
+
+@pytest.fixture
+def meshes():
+    # A 4x4 node sock and a 3x5 node plaque, generated together in one region
+    context = Context('test')
+    electrode_meshes = ElectrodeMeshes(context.getDefaultRegion())
+    sock_description = makePlateDescription(4, 4, 5, step=0.1)
+    electrode_meshes.setData(np.random.RandomState(0).standard_normal((16, 5)), sock_description['time_array'])
+    electrode_meshes.addMesh('sock', sock_description)
+    electrode_meshes.addMesh('plaque', makePlateDescription(3, 5, 5))
+    electrode_meshes.generateMeshes()
+    # Yielding keeps the context alive while the test uses its region
+    yield electrode_meshes
+
+
+def _regionSizes(electrode_meshes):
+    field_module = electrode_meshes.getMesh('sock').get_region().getFieldmodule()
+    nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+    return nodes.getSize(), field_module.findMeshByDimension(2).getSize()
+
+
+def test_meshes_have_own_groups_and_identifiers(meshes):
+    assert _regionSizes(meshes) == (31, 17)
+    sock = meshes.getMesh('sock')
+    plaque = meshes.getMesh('plaque')
+    assert (sock._nodeset_group.getSize(), sock._mesh_group.getSize()) == (16, 9)
+    assert (plaque._nodeset_group.getSize(), plaque._mesh_group.getSize()) == (15, 8)
+    assert list(plaque.get_node_identifiers()[[0, -1]]) == [1000000, 1000014]
+    assert meshes.getChannelIndexForNode(1000003) == 3
+
+
+def test_graphics_are_drawn_per_subgroup(meshes):
+    scene = meshes.getMesh('sock').get_region().getScene()
+    graphics = scene.getFirstGraphics()
+    subgroups = []
+    while graphics.isValid():
+        subgroups.append((graphics.getName(), graphics.getSubgroupField().getName()))
+        graphics = scene.getNextGraphics(graphics)
+    assert subgroups == [('{0}_{1}'.format(name, kind), name) for name in ('sock', 'plaque')
+                         for kind in ('lines', 'points', 'surfaces')]
+
+    meshes.setVisibility('plaque', False)
+    assert not meshes.isVisible('plaque')
+    assert meshes.isVisible('sock')
+
+
+def test_update_data_retimes_every_mesh(meshes):
+    data_times = list(np.linspace(0.0, 1.0, 7))
+    meshes.updateData(np.full((16, 7), 3.0), data_times)
+    for name in meshes.getMeshNames():
+        assert np.all(nodeParameters(meshes.getMesh(name), [], data_times) == 3.0)
+
+
+def test_update_geometry_retimes_coordinates(meshes):
+    description = makePlateDescription(4, 4, 9, step=0.2)
+    sock = meshes.getMesh('sock')
+    sock.update_geometry(description)
+    parameters = nodeParameters(sock, description['time_array'], []).reshape(16, 9, 3)
+    assert np.allclose(parameters[:, :, 2], np.arange(9) * 0.2)
+
+
+def test_new_grid_size_only_rebuilds_its_mesh(meshes):
+    meshes.getMesh('plaque').update_geometry(makePlateDescription(5, 5, 5))
+    assert _regionSizes(meshes) == (41, 25)
+    assert meshes.getMesh('plaque')._nodeset_group.getSize() == 25
+    assert meshes.getMesh('sock')._nodeset_group.getSize() == 16
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from mapclientplugins.ecgstep.model.resampler import resampleDecimate
+
+
+@pytest.mark.parametrize('sample_rate', [100, 1000, 2000])
+def test_decimate_filters_first_target(sample_rate):
+    # A 45 Hz sine is above the 5 Hz Nyquist frequency of 10 Hz targets, so it is filtered out, the first target
+    # at the first sample included
+    times = np.arange(0, 10, 1.0 / sample_rate)
+    target_times = np.arange(0, 9.95, 0.1)
+    decimated = resampleDecimate(np.sin(2 * np.pi * 45 * times)[None], times, target_times)[0]
+    assert abs(decimated[0]) < 0.01
+    assert np.abs(decimated[20:-20]).max() < 0.01
+
+
+@pytest.mark.parametrize('sample_rate', [100, 1000, 2000])
+def test_decimate_keeps_slow_signal_to_the_last_sample(sample_rate):
+    # Targets at the first and last samples follow a signal well below the cut off
+    times = np.arange(0, 10, 1.0 / sample_rate)
+    target_times = np.linspace(0, times[-1], 100)
+    signal = lambda t: np.sin(2 * np.pi * t + 0.3)
+    decimated = resampleDecimate(signal(times)[None], times, target_times)[0]
+    assert abs(decimated[0] - signal(target_times[0])) < 0.01
+    assert abs(decimated[-1] - signal(target_times[-1])) < 0.01
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from mapclientplugins.ecgstep.model.timeseriescache import TimeseriesCache
+
+
+def _makeTabularFrame(number_of_samples=1000):
+    # Channels indexed by sample number plus a timezone aware timestamp column, as a Tabular package returns them
+    frame = pd.DataFrame(np.random.RandomState(0).standard_normal((number_of_samples, 4)),
+                         columns=['ch{0}'.format(i + 1) for i in range(4)])
+    start = pd.Timestamp('2019-01-01', tz='UTC').value
+    frame.insert(0, 'time', pd.to_datetime(start + np.arange(number_of_samples) * 1000000, utc=True))
+    return frame
+
+
+def test_round_trip(tmp_path):
+    frame = _makeTabularFrame()
+    cache = TimeseriesCache(str(tmp_path))
+    cache.store(('check', 'Check', 'package', 'window'), 'modified', frame)
+    loaded = cache.load(('check', 'Check', 'package', 'window'), 'modified')
+    assert loaded is not None
+    pd.testing.assert_frame_equal(loaded, frame, check_index_type=False)
+
+
+def test_modified_package_misses(tmp_path):
+    cache = TimeseriesCache(str(tmp_path))
+    cache.store(('check', 'Check', 'package', 'window'), 'modified', _makeTabularFrame())
+    assert cache.load(('check', 'Check', 'package', 'window'), 'modified again') is None
+
+
+def test_disabled_without_directory():
+    cache = TimeseriesCache()
+    cache.store(('check', 'Check', 'package', 'window'), 'modified', _makeTabularFrame())
+    assert cache.load(('check', 'Check', 'package', 'window'), 'modified') is None
+
+
+def test_sample_rate_round_trip(tmp_path):
+    cache = TimeseriesCache(str(tmp_path))
+    cache.storeSampleRate(('check', 'Check', 'package'), 'modified', 250.0)
+    assert cache.loadSampleRate(('check', 'Check', 'package'), 'modified') == 250.0
+    assert cache.loadSampleRate(('check', 'Check', 'package'), 'modified again') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TimeseriesCache(str(tmp_path))
+    frame = _makeTabularFrame()
+    for window in range(3):
+        cache.store(('check', 'Check', 'package', window), 'modified', frame)
+        # Give each entry its own last use time, file times can be too coarse to tell them apart
+        os.utime(cache._getFilename(('check', 'Check', 'package', window)), (window, window))
+    entry_size = cache.getSize() // 3
+    # Using the oldest entry makes the second the least recently used
+    assert cache.load(('check', 'Check', 'package', 0), 'modified') is not None
+
+    cache.setMaximumSize(2 * entry_size)
+    assert cache.getSize() <= 2 * entry_size
+    assert cache.load(('check', 'Check', 'package', 1), 'modified') is None
+    assert cache.load(('check', 'Check', 'package', 0), 'modified') is not None
+    assert cache.load(('check', 'Check', 'package', 2), 'modified') is not None
+
+
+def test_clear(tmp_path):
+    cache = TimeseriesCache(str(tmp_path))
+    cache.store(('check', 'Check', 'package', 'window'), 'modified', _makeTabularFrame())
+    cache.storeSampleRate(('check', 'Check', 'package'), 'modified', 250.0)
+    cache.clear()
+    assert cache.getSize() == 0